@@ -0,0 +1,157 @@
+"""
+Bulk Configuration
+"""
+
+import asyncio
+import logging
+
+from dataclasses import fields, replace
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from .client import Client
+from .const import DEFAULT_BULK_CONCURRENCY, DEFAULT_BULK_RATE
+
+from . import models
+
+_LOGGER = logging.getLogger(__name__)
+
+Changes = Dict[str, Tuple[Any, Any]]
+
+
+class Setting(NamedTuple):
+    """ Readable and writable camera setting """
+
+    get: Callable[[Client], Awaitable[Any]]
+    set: Callable[[Client, Any], Awaitable[bool]]
+
+
+GENERAL = Setting(Client.get_general, Client.set_general)
+
+
+class ApplyResult(NamedTuple):
+    """ Per camera bulk apply result """
+
+    client: Client
+    changes: Changes
+    written: bool = False
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self):
+        """ Return True if the camera now matches """
+        return self.error is None and (self.written or not self.changes)
+
+
+class RateLimiter:
+    """ Token bucket, rate operations per second with a burst allowance """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """ wait for a token """
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if not self._stamp is None:
+                    self._tokens = min(
+                        self.burst, self._tokens + (now - self._stamp) * self.rate
+                    )
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def diff(current, desired) -> Changes:
+    """
+    fields set (not None) in desired that differ from current
+
+    Xml attributes (such as version) are not settings and are ignored.
+    """
+
+    attributes: Dict[str, str] = getattr(type(desired), "_attributes", {})
+    changes: Changes = {}
+    for field in fields(desired):
+        if field.name in attributes:
+            continue
+        value = getattr(desired, field.name)
+        if value is None:
+            continue
+        old = getattr(current, field.name, None)
+        if old != value:
+            changes[field.name] = (old, value)
+    return changes
+
+
+async def apply(
+    clients: Iterable[Client],
+    desired: Any,
+    setting: Setting = GENERAL,
+    concurrency: int = DEFAULT_BULK_CONCURRENCY,
+    rate: float = DEFAULT_BULK_RATE,
+):
+    """
+    Write desired settings (e.g. a SystemGeneral with only timezone set) to
+    every camera that differs
+
+    Current values are read first and cameras that already match are not
+    written. Reads and writes start at most rate per second with at most
+    concurrency cameras in progress. Returns an ApplyResult per client, in
+    order.
+    """
+
+    slots = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate, max(1, min(concurrency, int(rate))))
+
+    async def _apply(client: Client):
+        async with slots:
+            changes: Changes = {}
+            try:
+                await limiter.acquire()
+                current = await setting.get(client)
+                if current is None:
+                    raise ConnectionError("Failed to read current settings")
+
+                changes = diff(current, desired)
+                if not changes:
+                    return ApplyResult(client, changes)
+
+                await limiter.acquire()
+                # volatile fields such as the clock are not written back
+                # unless desired sets them, a stale copy would rewind them
+                values = dict.fromkeys(getattr(type(current), "_volatile", ()))
+                values.update((name, new) for name, (_, new) in changes.items())
+                update = replace(current, **values)
+                if not await setting.set(client, update):
+                    raise ConnectionError("Failed to write settings")
+                return ApplyResult(client, changes, True)
+            except Exception as err:  # pylint: disable=broad-except
+                _LOGGER.warning("Bulk apply to %s failed: %s", client.host, err)
+                return ApplyResult(client, changes, error=err)
+
+    return await asyncio.gather(*(_apply(client) for client in clients))
+
+
+async def apply_general(
+    clients: Iterable[Client], desired: models.SystemGeneral, **kwargs
+):
+    """ apply SystemGeneral settings, see apply """
+
+    return await apply(clients, desired, GENERAL, **kwargs)
@@ -5,11 +5,41 @@ client
 import logging
 import hashlib
 import asyncio
-
-from .const import DEFAULT_TIMEOUT
+import inspect
+
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .const import (
+    DEFAULT_STATS_INTERVAL,
+    DEFAULT_STREAM_QUEUE,
+    DEFAULT_TALK_LEAD,
+    DEFAULT_MIN_TIMEOUT,
+    DEFAULT_TIMEOUT,
+)
+from .rtt import RttEstimator
+from .stats import StreamHealth
+from .stream import Stream
+from .talk import Talk
 from .typings import Connection
+from .udp import open_udp_connection, retransmit_budget
 
 from . import models
+from .models import tracing
+from .models.const import MSG_ID_DOWNLOAD
+from .models.metadata import MSG_CLASS_MODERN_BINARY
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,15 +52,40 @@ class Client:
         port: int,
         username: str,
         password: str,
-        timeout: int = DEFAULT_TIMEOUT
+        timeout: int = DEFAULT_TIMEOUT,
+        udp: bool = False,
+        autocork: bool = False,
     ):
         self._host = host
         self._port = port
         self._username = username
         self._password = password
         self._timeout = timeout
+        self._udp = udp
+        minimum = DEFAULT_MIN_TIMEOUT
+        if udp:
+            # a reply recovered by backed off retransmissions is not lost
+            minimum += retransmit_budget()
+        self._rtt = RttEstimator(minimum=minimum, maximum=timeout)
         self._connection: Connection = None
         self._ready = False
+        self._connect_lock = asyncio.Lock()
+        self._login_done: Optional[asyncio.Event] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: Dict[Tuple[int, int], Deque[asyncio.Future]] = {}
+        self._streams: Dict[int, Stream] = {}
+        self._handle = 0
+        self._msg_num = 0
+        self._autocork = autocork
+        self._corked = 0
+        self._sent_msg_id: Optional[int] = None
+        self._outbox: List[bytes] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+
+    @property
+    def host(self):
+        """ Return the client host """
+        return self._host
 
     @property
     def connected(self):
@@ -41,17 +96,34 @@ class Client:
     def authenticated(self):
         """ Return the client authnetication status """
         return self._ready
+
+    @property
+    def round_trip(self):
+        """ Return the smoothed round trip time in seconds, if measured """
+        return self._rtt.srtt
     
     async def _ensure_connection(self):
+        # concurrent first requests share one connection
+        async with self._connect_lock:
+            return await self._connect()
+
+    async def _connect(self):
         if not self._connection:
-            connect = asyncio.open_connection(self._host, self._port)
+            if self._udp:
+                connect = open_udp_connection(self._host, self._port)
+            else:
+                connect = asyncio.open_connection(self._host, self._port)
             try:
-                self._connection = await asyncio.wait_for(connect, timeout=self._timeout)
+                self._connection = Connection(
+                    *await asyncio.wait_for(connect, timeout=self._rtt.timeout())
+                )
             except asyncio.TimeoutError:
                 _LOGGER.warn("Connection to %s timed out", self._host)
+                self._rtt.backoff()
                 self._connection = None
                 self._ready = False
                 return False
+            self._reader = asyncio.ensure_future(self._read_loop(self._connection))
         
         if self._connection.writer.transport.is_closing():
             self._ready = False
@@ -59,27 +131,200 @@ class Client:
 
         return True
 
+    async def _read_loop(self, connection: Connection):
+        try:
+            while True:
+                message = await models.Message.async_read(
+                    connection.reader.readexactly, False
+                )
+                await self._dispatch(message)
+        except (asyncio.IncompleteReadError, ConnectionError) as err:
+            _LOGGER.debug("Connection to %s closed: %s", self._host, err)
+        finally:
+            self._disconnected(connection)
+
+    async def _dispatch(self, message: models.Message):
+        # replies go to the oldest waiting request, everything else is routed
+        # to the stream registered for its ClientIndex, late replies to timed
+        # out requests carry a msg_num nobody waits for and are dropped
+        key = _route(message)
+        waiters = self._pending.get(key)
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(message)
+                return
+
+        stream = self._streams.get(key[1])
+        if not stream is None:
+            await stream.put(message)
+            return
+
+        _LOGGER.debug(
+            "Dropping unrouted message %s from %s", message.meta.msg_id, self._host
+        )
+
+    def _disconnected(self, connection: Connection):
+        if not self._connection is connection:
+            return
+        self._connection = None
+        self._ready = False
+        self._outbox.clear()
+        for waiters in self._pending.values():
+            for future in waiters:
+                if not future.done():
+                    future.set_result(None)
+        self._pending.clear()
+        for stream in self._streams.values():
+            stream.end()
+        self._streams.clear()
+
+    def _next_handle(self):
+        in_use = {stream.client_idx.handle for stream in self._streams.values()}
+        for _ in range(255):
+            self._handle = self._handle % 255 + 1
+            if not self._handle in in_use:
+                return self._handle
+        raise RuntimeError(f"No free stream handle on {self._host}")
+
     async def _send(self, message: models.Message, drain: bool = True):
-        await self._ensure_connection()
-        self._connection.writer.write(message.tobytes())
-        if drain:
-            await self._connection.writer.drain()
-
-    async def _recv(self, exact: bool = True):
-        if exact:
-            read = models.Message.async_read(self._connection.reader.readexactly)
+        if not await self._ensure_connection():
+            return False
+        writer = self._connection.writer
+        data = message.tobytes()
+        self._sent_msg_id = message.meta.msg_id
+        if self._corked or self._autocork:
+            # coalesced into one writelines, by the end of the batch or by
+            # the next loop iteration
+            self._outbox.append(data)
+            if not self._corked:
+                self._schedule_flush()
         else:
-            read = models.Message.async_read(self._connection.reader.read)
+            writer.write(data)
+        if drain and _needs_drain(writer):
+            await _drain(writer, message.meta.msg_id)
+        return True
+
+    async def _send_buffers(self, message: models.Message):
+        # binary payloads are handed to writelines uncopied, corked requests
+        # are written first to keep the order
+        if not await self._ensure_connection():
+            return False
+        self._flush()
+        writer = self._connection.writer
+        writer.writelines(message.tobuffers())
+        self._sent_msg_id = message.meta.msg_id
+        if _needs_drain(writer):
+            await _drain(writer, message.meta.msg_id)
+        return True
 
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        if not self._flush_handle is None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._outbox or self._connection is None:
+            return
+        outbox = self._outbox
+        self._outbox = []
+        self._connection.writer.writelines(outbox)
+
+    @asynccontextmanager
+    async def batch(self):
+        """
+        Cork requests sent within the block into a single write
+
+        Requests started inside the block (e.g. through asyncio.gather) are
+        written together once all of them are queued, their replies are
+        pipelined. The remaining requests are written when the block exits.
+        """
+
+        self._corked += 1
         try:
-            return await asyncio.wait_for(read, timeout=self._timeout)
+            yield self
+        finally:
+            self._corked -= 1
+            if not self._corked:
+                self._flush()
+                if not self._connection is None and _needs_drain(
+                    self._connection.writer
+                ):
+                    await _drain(self._connection.writer, self._sent_msg_id)
+
+    def _number(self, message: models.Message):
+        # plain requests share msg_id and ClientIndex, a message number keeps
+        # a late reply from resolving the next request. Stream requests are
+        # told apart by handle, binary payloads may be encrypted against the
+        # index and keep it.
+        client_idx = message.meta.client_idx
+        if client_idx.handle or message.meta.msg_class == MSG_CLASS_MODERN_BINARY:
+            return
+        self._msg_num = self._msg_num % 255 + 1
+        client_idx.msg_num = self._msg_num
+
+    def _expect(self, message: models.Message):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(_route(message), deque()).append(future)
+        return future
+
+    async def _recv(
+        self,
+        future: "asyncio.Future[models.Message]",
+        parse: bool = True,
+        msg_id: Optional[int] = None,
+        sent: Optional[float] = None,
+    ):
+        if self._outbox:
+            # a corked request is awaited, write it once the other requests
+            # of this iteration are queued
+            self._schedule_flush()
+        try:
+            reply = await asyncio.wait_for(future, timeout=self._rtt.timeout(msg_id))
         except asyncio.TimeoutError:
             _LOGGER.error("Timeout waiting for response from %s", self._host)
+            self._rtt.backoff(msg_id)
+            return None
+
+        if reply is None:
+            return None
+        if not sent is None:
+            self._rtt.sample(asyncio.get_running_loop().time() - sent, msg_id)
+        if parse:
+            reply.parse()
+        return reply
+
+    async def _request(self, message: models.Message, parse: bool = True):
+        self._number(message)
+        reply = self._expect(message)
+        if not await self._ensure_connection():
+            reply.cancel()
+            return None
+        sent = asyncio.get_running_loop().time()
+        if not await self._send(message):
+            reply.cancel()
+            return None
+        return await self._recv(reply, parse, message.meta.msg_id, sent)
 
     async def _ensure_auth(self):
         if self._ready:
             return True
+        login_done = self._login_done
+        if not login_done is None:
+            # concurrent first requests wait for one login, the event wakes
+            # them in the same iteration so a batch still corks together
+            await login_done.wait()
+            return self._ready
+        login_done = self._login_done = asyncio.Event()
+        try:
+            return await self._login()
+        finally:
+            self._login_done = None
+            login_done.set()
 
+    async def _login(self):
         _LOGGER.debug(
             "Reolink camera with host %s:%s trying to log in with user %s",
             self._host,
@@ -93,32 +338,49 @@ class Client:
         legacy_login = models.Message.from_legacy(
             models.LegacyLogin(md5_username, md5_password)
         )
-        await self._send(legacy_login)
-        login_reply = await self._recv()
+        login_reply = await self._request(legacy_login)
+        if login_reply is None:
+            return False
         xml: models.XmlBody = login_reply.body.xml
         nonce = xml.encryption.nonce
 
         md5_username = _md5_string(f"{self._username}{nonce}", False)
         md5_password = _md5_string(f"{self._password}{nonce}", False)
 
-        modern_login = models.Message.login(md5_username, md5_password)
-        await self._send(modern_login)
-        modern_reply = await self._recv()
+        udp_port = 0
+        if self._udp:
+            udp_port = self._connection.writer.get_extra_info("sockname")[1]
+        modern_login = models.Message.login(
+            md5_username, md5_password, udp_port=udp_port
+        )
+        modern_reply = await self._request(modern_login)
+        if modern_reply is None:
+            return False
         xml = modern_reply.body.xml
 
+        self._ready = True
         return True
 
+    async def request(self, message: models.Message, parse: bool = True):
+        """
+        Send a request after logging in and return the reply, None on failure
+
+        With parse False the reply xml is left in body.raw, see Message.parse.
+        """
+
+        if not await self._ensure_auth():
+            return None
+        return await self._request(message, parse)
+
     async def ping(self):
         """ Ping (NoOp) camera """
 
         if not await self._ensure_auth():
             return False
         ping = models.Message.ping()
-        await self._send(ping)
-        #ping_reply = 
-        await self._recv()
+        ping_reply = await self._request(ping)
         # xml: models.XmlBody = ping_reply.body.xml
-        return True
+        return not ping_reply is None
 
     async def get_version(self):
         """ Get Camera Version Info """
@@ -126,8 +388,9 @@ class Client:
         if not await self._ensure_auth():
             return None
         version = models.Message.version()
-        await self._send(version)
-        version_reply = await self._recv()
+        version_reply = await self._request(version)
+        if version_reply is None:
+            return None
         xml: models.XmlBody = version_reply.body.xml
 
         return xml.version_info
@@ -139,22 +402,281 @@ class Client:
             return None
 
         general = models.Message.general()
-        await self._send(general)
-        general_reply = await self._recv()
+        general_reply = await self._request(general)
+        if general_reply is None:
+            return None
         xml: models.XmlBody = general_reply.body.xml
 
         return xml.system_general
 
-    async def get_stream(self):
-        """ Get Camera Stream """
+    async def set_general(self, general: models.SystemGeneral):
+        """ Set Camera General Info """
+
+        if not await self._ensure_auth():
+            return False
+
+        set_general = models.Message.set_general(general)
+        set_general_reply = await self._request(set_general)
+        if set_general_reply is None:
+            return False
+        if set_general_reply.meta.rejected:
+            _LOGGER.error(
+                "%s rejected settings with response code %d",
+                self._host,
+                set_general_reply.meta.response_code,
+            )
+            return False
+
+        return True
+
+    async def get_stream(
+        self,
+        channel: int = 0,
+        stream_type: models.StreamType = models.StreamType.MAIN,
+        maxsize: int = DEFAULT_STREAM_QUEUE,
+        keyframes_only: bool = False,
+    ):
+        """
+        Get Camera Stream
+
+        Several streams (main and sub, or channels of an NVR) can be open at
+        once, they share the connection and are demultiplexed by handle.
+        A keyframes_only stream drops P-frames and audio as they arrive, see
+        Stream.frames for sampling down to a frame rate. Streams keep
+        statistics, see stream_stats.
+        """
 
         if not await self._ensure_auth():
             return None
 
-        preview = models.Message.preview()
-        await self._send(preview)
-        # TODO : the rest
+        handle = self._next_handle()
+        preview = models.Message.preview(channel, stream_type, handle)
+
+        async def _stop(stream: Stream):
+            self._streams.pop(stream.key, None)
+            if self.connected:
+                await self._send(models.Message.preview_stop(channel, stream_type, handle))
+
+        stream = Stream(
+            preview.meta.client_idx,
+            maxsize,
+            on_close=_stop,
+            keyframes_only=keyframes_only,
+            stats=True,
+        )
+        self._streams[stream.key] = stream
+        if await self._request(preview) is None:
+            self._streams.pop(stream.key, None)
+            stream.end()
+            return None
+
+        return stream
+
+    def stream_stats(self) -> List[StreamHealth]:
+        """ statistics snapshot of every open live stream """
+
+        healths = (stream.health() for stream in self._streams.values())
+        return [health for health in healths if not health is None]
+
+    async def report_stream_stats(
+        self,
+        callback: Callable[[List[StreamHealth]], Optional[Awaitable[None]]],
+        interval: float = DEFAULT_STATS_INTERVAL,
+    ):
+        """
+        Call callback with stream_stats every interval seconds
+
+        Runs until cancelled, start it as a task next to the streams.
+        """
 
+        while True:
+            await asyncio.sleep(interval)
+            result = callback(self.stream_stats())
+            if inspect.isawaitable(result):
+                await result
+
+    async def talk(
+        self,
+        channel: int = 0,
+        audio_config: Optional[models.AudioConfig] = None,
+        lead: float = DEFAULT_TALK_LEAD,
+    ):
+        """
+        Open Camera Talkback
+
+        Returns a Talk sink for ADPCM (default, 16kHz mono) or AAC frames
+        matching audio_config, None if the camera refused it.
+        """
+
+        if not await self._ensure_auth():
+            return None
+
+        if audio_config is None:
+            audio_config = models.AudioConfig()
+        talk_config = models.Message.talk_config(channel, audio_config)
+        if await self._request(talk_config) is None:
+            return None
+
+        async def _stop(_: Talk):
+            if self.connected:
+                await self._send(models.Message.talk_reset(channel))
+
+        return Talk(self._send_buffers, channel, audio_config, lead, on_close=_stop)
+
+    async def search_recordings(
+        self,
+        channel: int,
+        start: datetime,
+        end: datetime,
+        stream_type: models.StreamType = models.StreamType.MAIN,
+    ) -> AsyncIterator[models.FileInfo]:
+        """ Search Camera Recordings, fetching result pages lazily """
+
+        if not await self._ensure_auth():
+            return
+
+        search = models.Message.file_info_list_open(channel, start, end, stream_type)
+        search_reply = await self._request(search)
+        xml: models.XmlBody = search_reply.body.xml if search_reply else None
+        if xml is None or xml.file_info_list is None:
+            return
+
+        file_info = xml.file_info_list.file_info
+        if file_info is None or file_info.handle is None:
+            # nothing found, or the search is not supported
+            return
+
+        handle = file_info.handle
+        parser = models.XmlPullParser(models.FileInfo)
+        try:
+            while True:
+                page = models.Message.file_info_list_get(
+                    channel, handle, self._next_handle()
+                )
+                found = False
+                async for file in self._document(page, parser):
+                    found = True
+                    yield file
+                if not found or not parser.complete:
+                    break
+        finally:
+            await self._request(models.Message.file_info_list_close(channel, handle))
+
+    async def _document(
+        self, message: models.Message, parser: models.XmlPullParser
+    ) -> AsyncIterator:
+        # a reply document may span several messages, they are routed to a
+        # stream until the document is closed
+        stream = Stream(message.meta.client_idx, drop=False)
+        self._streams[stream.key] = stream
+        try:
+            if not await self._send(message):
+                return
+            while True:
+                try:
+                    reply = await asyncio.wait_for(
+                        stream.read(), timeout=self._rtt.timeout(message.meta.msg_id)
+                    )
+                except asyncio.TimeoutError:
+                    _LOGGER.error("Timeout waiting for response from %s", self._host)
+                    self._rtt.backoff(message.meta.msg_id)
+                    return
+                raw = getattr(reply.body, "raw", None) if not reply is None else None
+                if not raw:
+                    return
+                for entry in parser.feed(raw):
+                    yield entry
+                if parser.complete:
+                    return
+        finally:
+            self._streams.pop(stream.key, None)
+            stream.end()
+
+    async def download(
+        self,
+        file: models.FileInfo,
+        write: Callable[[memoryview], Optional[Awaitable[None]]],
+    ):
+        """ Download Camera Recording, streaming chunks to write """
+
+        if not await self._ensure_auth():
+            return 0
+
+        handle = self._next_handle()
+        request = models.Message.download(file, handle)
+        stream = Stream(request.meta.client_idx, drop=False)
+        self._streams[stream.key] = stream
+        total = 0
+        sent = False
+        finished = False
+        try:
+            if not await self._send(request):
+                return 0
+            sent = True
+            while file.size is None or total < file.size:
+                try:
+                    chunk = await asyncio.wait_for(
+                        stream.read(), timeout=self._rtt.timeout(MSG_ID_DOWNLOAD)
+                    )
+                except asyncio.TimeoutError:
+                    _LOGGER.error("Timeout downloading %s from %s", file.name, self._host)
+                    break
+                if chunk is None:
+                    break
+                binary = getattr(chunk.body, "binary", None)
+                if binary is None:
+                    # the first reply only acknowledges, a later empty one ends it
+                    if total > 0:
+                        finished = True
+                        break
+                    continue
+                result = write(binary)
+                if inspect.isawaitable(result):
+                    await result
+                total += len(binary)
+            else:
+                finished = True
+        finally:
+            self._streams.pop(stream.key, None)
+            stream.end()
+            if sent and not finished and self.connected:
+                # the camera keeps sending the file on the shared connection
+                # until told to stop
+                await self._send(models.Message.download_stop(file, handle))
+
+        return total
+
+    async def download_many(
+        self,
+        files: Iterable[models.FileInfo],
+        open_writer: Callable[
+            [models.FileInfo], Callable[[memoryview], Optional[Awaitable[None]]]
+        ],
+        parallel: int = 1,
+    ):
+        """
+        Download Camera Recordings, running up to parallel channels at once
+
+        Downloads share the connection, files on the same channel are
+        downloaded in order. Returns the bytes written per file.
+        """
+
+        files = list(files)
+        channels: Dict[int, List[int]] = {}
+        for idx, file in enumerate(files):
+            channels.setdefault(file.channel_id, []).append(idx)
+        results: List[int] = [0] * len(files)
+        slots = asyncio.Semaphore(parallel)
+
+        async def _channel(indexes: List[int]):
+            async with slots:
+                for idx in indexes:
+                    file = files[idx]
+                    results[idx] = await self.download(file, open_writer(file))
+
+        await asyncio.gather(*(_channel(indexes) for indexes in channels.values()))
+
+        return results
 
     async def close(self):
         """ Close camera connection """
@@ -162,18 +684,48 @@ class Client:
         if not self.connected:
             return False
         
+        self._flush()
         connection = self._connection
-        self._connection = None
-        self._ready = False
+        if not self._reader is None:
+            self._reader.cancel()
+            self._reader = None
+        self._disconnected(connection)
         connection.writer.close()
         await connection.writer.wait_closed()
 
         return True
         
+def _needs_drain(writer: asyncio.StreamWriter):
+    # only wait when the transport buffer is over its high-water mark, the
+    # UDP writer drains on its own send window
+    if not isinstance(writer, asyncio.StreamWriter):
+        return True
+    transport = writer.transport
+    (_, high) = transport.get_write_buffer_limits()
+    return transport.get_write_buffer_size() > high
+
+async def _drain(writer: asyncio.StreamWriter, msg_id: Optional[int] = None):
+    tracer = tracing.TRACER
+    if tracer is None:
+        await writer.drain()
+        return
+    size = None
+    if isinstance(writer, asyncio.StreamWriter):
+        size = writer.transport.get_write_buffer_size()
+    span = tracer.start(tracing.SPAN_DRAIN, msg_id, size)
+    try:
+        await writer.drain()
+    finally:
+        tracer.end(span, size)
+
+def _route(message: models.Message):
+    return (message.meta.msg_id, message.meta.client_idx.__to_int__())
+
 def _md5_string(input: str, padzero: bool = True):
     if len(input) > 0:
-        input = hashlib.md5(input).hexdigest()
+        input = hashlib.md5(input.encode()).hexdigest()
 
     if padzero:
         return input.ljust(32, "\0")
+    return input
     
\ No newline at end of file
@@ -2,4 +2,60 @@
 Constants
 """
 
+from .models.const import (
+    MSG_ID_DOWNLOAD,
+    MSG_ID_FILE_INFO_LIST_GET,
+    MSG_ID_FILE_INFO_LIST_OPEN,
+    MSG_ID_LOGIN,
+    MSG_ID_SET_GENERAL,
+    MSG_ID_TALK_CONFIG,
+    MSG_ID_VIDEO,
+)
+
+DEFAULT_PORT = 9000
+
 DEFAULT_TIMEOUT = 30
+DEFAULT_INITIAL_TIMEOUT = 3
+# RFC 6298 minimum retransmission timeout
+DEFAULT_MIN_TIMEOUT = 1
+
+TIMEOUT_FLOORS = {
+    MSG_ID_LOGIN: 5,
+    MSG_ID_VIDEO: 5,
+    MSG_ID_DOWNLOAD: 5,
+    MSG_ID_FILE_INFO_LIST_OPEN: 5,
+    MSG_ID_FILE_INFO_LIST_GET: 5,
+    MSG_ID_SET_GENERAL: 5,
+    MSG_ID_TALK_CONFIG: 5,
+}
+
+DEFAULT_STREAM_QUEUE = 64
+DEFAULT_STREAM_STALL = 10
+
+DEFAULT_UDP_MTU = 1350
+DEFAULT_UDP_WINDOW = 256
+DEFAULT_UDP_RETRIES = 8
+
+DEFAULT_PRE_EVENT_SECONDS = 10
+DEFAULT_PRE_EVENT_BYTES = 16 * 1024 * 1024
+
+# an unroutable /16 is probed in about 65534 / 1024 * 0.25 = 16 seconds
+DEFAULT_SCAN_CONCURRENCY = 1024
+DEFAULT_PROBE_TIMEOUT = 0.25
+# descriptors left for everything but probes
+DESCRIPTOR_RESERVE = 128
+DEFAULT_LOGIN_CONCURRENCY = 16
+
+DEFAULT_BULK_CONCURRENCY = 32
+DEFAULT_BULK_RATE = 50
+
+DEFAULT_SEGMENT_SECONDS = 2
+DEFAULT_PLAYLIST_WINDOW = 6
+
+DEFAULT_STATS_WINDOW = 5
+DEFAULT_STATS_INTERVAL = 10
+
+DEFAULT_TALK_LEAD = 0.1
+
+DEFAULT_POLL_INTERVAL = 60
+DEFAULT_POLL_CONCURRENCY = 32
@@ -0,0 +1,178 @@
+"""
+LAN Discovery
+"""
+
+import asyncio
+import ipaddress
+import logging
+import struct
+
+from typing import AsyncIterator, Iterable, NamedTuple, Optional, Union
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from .client import Client
+from .const import (
+    DEFAULT_LOGIN_CONCURRENCY,
+    DEFAULT_PORT,
+    DEFAULT_PROBE_TIMEOUT,
+    DEFAULT_SCAN_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    DESCRIPTOR_RESERVE,
+)
+
+from . import models
+from .models.metadata import HEADER_STRUCT_SIZE, MAGIC_HEADER
+
+MAGIC_STRUCT = "!I"
+
+_LOGGER = logging.getLogger(__name__)
+
+Hosts = Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network, Iterable[str]]
+
+
+class Device(NamedTuple):
+    """ Discovered Device """
+
+    host: str
+    port: int
+    version_info: Optional[models.VersionInfo] = None
+    session: Optional[Client] = None
+
+    def client(
+        self, username: Optional[str] = None, password: Optional[str] = None, **kwargs
+    ):
+        """
+        Client for the device
+
+        Without credentials this is the session scan logged in with, if any.
+        """
+
+        if username is None and not self.session is None:
+            return self.session
+        return Client(self.host, self.port, username, password, **kwargs)
+
+
+async def probe(
+    host: str, port: int = DEFAULT_PORT, timeout: float = DEFAULT_PROBE_TIMEOUT
+):
+    """
+    Check for a Baichuan device without logging in
+
+    Sends the legacy login request and only checks that the reply starts
+    with a Baichuan header. timeout covers the connect and the reply.
+    """
+
+    try:
+        return await asyncio.wait_for(_probe(host, port), timeout)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return False
+
+
+async def _probe(host: str, port: int):
+    writer = None
+    try:
+        (reader, writer) = await asyncio.open_connection(host, port)
+        request = models.Message.from_legacy(models.LegacyLogin("", ""))
+        writer.write(request.tobytes())
+        header = await reader.readexactly(HEADER_STRUCT_SIZE)
+        (magic,) = struct.unpack_from(MAGIC_STRUCT, header)
+        return magic == MAGIC_HEADER
+    finally:
+        if not writer is None:
+            writer.close()
+
+
+def _descriptors(concurrency: int):
+    # probes beyond the open file limit would fail as if nothing answered
+    if resource is None:
+        return concurrency
+    (soft, _) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return concurrency
+    return max(1, min(concurrency, soft - DESCRIPTOR_RESERVE))
+
+
+def _hosts(hosts: Hosts):
+    if isinstance(hosts, str):
+        hosts = ipaddress.ip_network(hosts, strict=False)
+    if isinstance(hosts, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        if hosts.num_addresses == 1:
+            return (str(hosts.network_address),)
+        return (str(host) for host in hosts.hosts())
+    return hosts
+
+
+async def scan(
+    hosts: Hosts,
+    port: int = DEFAULT_PORT,
+    concurrency: int = DEFAULT_SCAN_CONCURRENCY,
+    timeout: float = DEFAULT_PROBE_TIMEOUT,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    login_concurrency: int = DEFAULT_LOGIN_CONCURRENCY,
+) -> AsyncIterator[Device]:
+    """
+    Probe hosts (a network such as "192.168.0.0/16" or an iterable of
+    addresses) and yield devices as they respond
+
+    At most concurrency probes are in flight, fewer when the open file
+    limit is lower. Addresses that do not answer take the whole timeout, so
+    an unroutable /16 takes about 65534 / concurrency * timeout seconds,
+    16 seconds with the defaults. Under the common 1024 descriptor soft
+    limit concurrency drops to 896 and the /16 takes about 18 seconds.
+
+    With credentials, VersionInfo is fetched for each device, at most
+    login_concurrency logins at a time. The logged in client is kept open and
+    handed back as Device.session, close it when done.
+    """
+
+    addresses = iter(_hosts(hosts))
+    found: "asyncio.Queue[Optional[Device]]" = asyncio.Queue()
+    logins = asyncio.Semaphore(login_concurrency)
+
+    async def _identify(host: str):
+        client = Client(host, port, username, password, DEFAULT_TIMEOUT)
+        version_info = None
+        try:
+            async with logins:
+                version_info = await client.get_version()
+        except Exception as err:  # pylint: disable=broad-except
+            # a bad reply from one device must not end the scan, it is still
+            # reported, without version_info
+            _LOGGER.warning("Version fetch from %s failed: %r", host, err)
+        finally:
+            if version_info is None:
+                await client.close()
+        if version_info is None:
+            return (None, None)
+        return (version_info, client)
+
+    async def _worker():
+        # a fixed pool of workers keeps task and socket counts bounded
+        for host in addresses:
+            if not await probe(host, port, timeout):
+                continue
+            (version_info, session) = (None, None)
+            if not username is None:
+                (version_info, session) = await _identify(host)
+            await found.put(Device(host, port, version_info, session))
+
+    workers = [
+        asyncio.ensure_future(_worker()) for _ in range(_descriptors(concurrency))
+    ]
+    done = asyncio.ensure_future(asyncio.gather(*workers))
+    done.add_done_callback(lambda _: found.put_nowait(None))
+    try:
+        while True:
+            device = await found.get()
+            if device is None:
+                break
+            yield device
+        await done
+    finally:
+        for worker in workers:
+            worker.cancel()
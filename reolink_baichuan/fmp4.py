@@ -0,0 +1,523 @@
+"""
+Fragmented MP4 Muxer
+"""
+
+import logging
+import re
+import struct
+
+from typing import List, NamedTuple, Optional, Tuple
+
+from .const import DEFAULT_SEGMENT_SECONDS
+from .models.media import US_PER_SECOND, Frame, Info, MediaClock, MediaKind
+from .models.typings import BufferTypes
+
+_LOGGER = logging.getLogger(__name__)
+
+TIMESCALE = 90000
+TRACK_ID = 1
+
+CODEC_H264 = "H264"
+CODEC_H265 = "H265"
+
+H264_SPS = 7
+H264_PPS = 8
+H264_AUD = 9
+
+H265_VPS = 32
+H265_SPS = 33
+H265_PPS = 34
+H265_AUD = 35
+
+_PARAMETER_SETS = {
+    CODEC_H264: (H264_SPS, H264_PPS),
+    CODEC_H265: (H265_VPS, H265_SPS, H265_PPS),
+}
+_OUT_OF_BAND = {
+    CODEC_H264: (H264_SPS, H264_PPS, H264_AUD),
+    CODEC_H265: (H265_VPS, H265_SPS, H265_PPS, H265_AUD),
+}
+
+_START_CODE = re.compile(b"\x00\x00\x01")
+
+BOX_STRUCT = "!I4s"
+BOX_STRUCT_SIZE = struct.calcsize(BOX_STRUCT)
+
+# size, type, version and flags, sequence number
+MFHD_STRUCT = "!I4sII"
+MFHD_STRUCT_SIZE = struct.calcsize(MFHD_STRUCT)
+# size, type, version and flags, track id
+TFHD_STRUCT = "!I4sII"
+TFHD_STRUCT_SIZE = struct.calcsize(TFHD_STRUCT)
+TFHD_DEFAULT_BASE_IS_MOOF = 0x020000
+# size, type, version and flags, base media decode time
+TFDT_STRUCT = "!I4sIQ"
+TFDT_STRUCT_SIZE = struct.calcsize(TFDT_STRUCT)
+# size, type, version and flags, sample count, data offset
+TRUN_STRUCT = "!I4sIIi"
+TRUN_STRUCT_SIZE = struct.calcsize(TRUN_STRUCT)
+TRUN_FLAGS = 0x000701
+# duration, size, flags
+TRUN_SAMPLE_STRUCT = "!III"
+TRUN_SAMPLE_STRUCT_SIZE = struct.calcsize(TRUN_SAMPLE_STRUCT)
+
+NAL_LENGTH_STRUCT = "!I"
+NAL_LENGTH_SIZE = struct.calcsize(NAL_LENGTH_STRUCT)
+
+SAMPLE_FLAGS_SYNC = 0x02000000
+SAMPLE_FLAGS_NON_SYNC = 0x01010000
+
+_MATRIX = struct.pack("!9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+
+class Fragment(NamedTuple):
+    """ Media fragment, a moof and mdat pair """
+
+    sequence: int
+    segment: int
+    part: int
+    start: float
+    duration: float
+    independent: bool
+    last: bool
+    init: int
+    data: bytearray
+
+
+class _Sample:
+    __slots__ = ("units", "size", "time", "duration", "keyframe")
+
+    def __init__(self, units: List[memoryview], time: int, keyframe: bool):
+        self.units = units
+        self.size = sum(NAL_LENGTH_SIZE + len(unit) for unit in units)
+        self.time = time
+        self.duration = 0
+        self.keyframe = keyframe
+
+
+def nal_units(payload: BufferTypes) -> List[memoryview]:
+    """ split an Annex B payload into NAL unit views, nothing is copied """
+
+    view = memoryview(payload)
+    starts = [match.end() for match in _START_CODE.finditer(view)]
+    if not starts:
+        return [view] if len(view) else []
+    units = []
+    for idx, start in enumerate(starts):
+        end = starts[idx + 1] - 3 if idx + 1 < len(starts) else len(view)
+        # zero bytes before a start code are never part of the unit
+        while end > start and view[end - 1] == 0:
+            end -= 1
+        if end > start:
+            units.append(view[start:end])
+    return units
+
+
+def nal_type(codec: str, unit: BufferTypes):
+    """ NAL unit type from the unit header """
+
+    if codec == CODEC_H265:
+        return (unit[0] >> 1) & 0x3F
+    return unit[0] & 0x1F
+
+
+def rbsp(unit: BufferTypes):
+    """ unit payload with emulation prevention bytes removed """
+
+    return bytes(unit).replace(b"\x00\x00\x03", b"\x00\x00")
+
+
+def _box(kind: bytes, *payloads: bytes):
+    payload = b"".join(payloads)
+    return struct.pack(BOX_STRUCT, BOX_STRUCT_SIZE + len(payload), kind) + payload
+
+
+def _full_box(kind: bytes, version: int, flags: int, *payloads: bytes):
+    return _box(kind, struct.pack("!I", (version << 24) | flags), *payloads)
+
+
+def avc_config(sps: BufferTypes, pps: BufferTypes):
+    """ AVCDecoderConfigurationRecord (avcC payload) """
+
+    sps = bytes(sps)
+    pps = bytes(pps)
+    header = rbsp(sps[:8])
+    return (
+        struct.pack("!BBBBBB", 1, header[1], header[2], header[3], 0xFF, 0xE1)
+        + struct.pack("!H", len(sps))
+        + sps
+        + struct.pack("!BH", 1, len(pps))
+        + pps
+    )
+
+
+def _profile_tier_level(sps: BufferTypes):
+    data = rbsp(bytes(sps[:32]))
+    # 2 byte NAL header, then vps id, sub layers and temporal id nesting
+    return (data[2], data[3:15])
+
+
+def hevc_config(vps: BufferTypes, sps: BufferTypes, pps: BufferTypes):
+    """
+    HEVCDecoderConfigurationRecord (hvcC payload)
+
+    Profile, tier and level come from the SPS, chroma format and bit depth
+    are assumed to be 4:2:0 8 bit as sent by the cameras.
+    """
+
+    (layers, ptl) = _profile_tier_level(sps)
+    temporal_layers = ((layers >> 1) & 0x07) + 1
+    nesting = layers & 0x01
+    arrays = b""
+    for (kind, unit) in ((H265_VPS, vps), (H265_SPS, sps), (H265_PPS, pps)):
+        unit = bytes(unit)
+        arrays += struct.pack("!BHH", 0x80 | kind, 1, len(unit)) + unit
+    return (
+        struct.pack("!B", 1)
+        + ptl
+        + struct.pack(
+            "!HBBBBHBB",
+            0xF000,
+            0xFC,
+            0xFC | 1,
+            0xF8,
+            0xF8,
+            0,
+            (temporal_layers << 3) | (nesting << 2) | 0x03,
+            3,
+        )
+        + arrays
+    )
+
+
+def codec_string(codec: str, parameter_sets: Tuple[bytes, ...]):
+    """ RFC 6381 codecs value, as used in HLS CODECS attributes """
+
+    if codec == CODEC_H264:
+        header = rbsp(parameter_sets[0][:8])
+        return "avc1.%02X%02X%02X" % (header[1], header[2], header[3])
+
+    (_, ptl) = _profile_tier_level(parameter_sets[1])
+    space = ("", "A", "B", "C")[ptl[0] >> 6]
+    tier = "H" if ptl[0] & 0x20 else "L"
+    (compatibility,) = struct.unpack_from("!I", ptl, 1)
+    compatibility = int("{:032b}".format(compatibility)[::-1], 2)
+    constraints = list(ptl[5:11])
+    while constraints and constraints[-1] == 0:
+        constraints.pop()
+    return ".".join(
+        [
+            "hvc1",
+            "%s%d" % (space, ptl[0] & 0x1F),
+            "%X" % compatibility,
+            "%s%d" % (tier, ptl[11]),
+        ]
+        + ["%X" % byte for byte in constraints]
+    )
+
+
+def init_segment(
+    codec: str, parameter_sets: Tuple[bytes, ...], width: int, height: int
+):
+    """ ftyp and moov for a single video track """
+
+    if codec == CODEC_H265:
+        entry = b"hvc1"
+        config = _box(b"hvcC", hevc_config(*parameter_sets))
+    else:
+        entry = b"avc1"
+        config = _box(b"avcC", avc_config(*parameter_sets))
+
+    sample_entry = _box(
+        entry,
+        bytes(6),
+        struct.pack("!H", 1),
+        bytes(16),
+        struct.pack("!HHIIIH", width, height, 0x480000, 0x480000, 0, 1),
+        bytes(32),
+        struct.pack("!Hh", 0x18, -1),
+        config,
+    )
+    empty_table = struct.pack("!I", 0)
+    stbl = _box(
+        b"stbl",
+        _full_box(b"stsd", 0, 0, struct.pack("!I", 1), sample_entry),
+        _full_box(b"stts", 0, 0, empty_table),
+        _full_box(b"stsc", 0, 0, empty_table),
+        _full_box(b"stsz", 0, 0, empty_table, empty_table),
+        _full_box(b"stco", 0, 0, empty_table),
+    )
+    minf = _box(
+        b"minf",
+        _full_box(b"vmhd", 0, 1, bytes(8)),
+        _box(
+            b"dinf",
+            _full_box(b"dref", 0, 0, struct.pack("!I", 1), _full_box(b"url ", 0, 1)),
+        ),
+        stbl,
+    )
+    mdia = _box(
+        b"mdia",
+        _full_box(b"mdhd", 0, 0, struct.pack("!IIIIHH", 0, 0, TIMESCALE, 0, 0x55C4, 0)),
+        _full_box(b"hdlr", 0, 0, bytes(4), b"vide", bytes(12), b"VideoHandler\x00"),
+        minf,
+    )
+    trak = _box(
+        b"trak",
+        _full_box(
+            b"tkhd",
+            0,
+            0x03,
+            struct.pack("!IIIII", 0, 0, TRACK_ID, 0, 0),
+            bytes(8),
+            struct.pack("!hhhH", 0, 0, 0, 0),
+            _MATRIX,
+            struct.pack("!II", width << 16, height << 16),
+        ),
+        mdia,
+    )
+    moov = _box(
+        b"moov",
+        _full_box(
+            b"mvhd",
+            0,
+            0,
+            struct.pack("!IIIIIH", 0, 0, TIMESCALE, 0, 0x10000, 0x100),
+            bytes(10),
+            _MATRIX,
+            bytes(24),
+            struct.pack("!I", TRACK_ID + 1),
+        ),
+        trak,
+        _box(
+            b"mvex",
+            _full_box(b"trex", 0, 0, struct.pack("!IIIII", TRACK_ID, 1, 0, 0, 0)),
+        ),
+    )
+    ftyp = _box(b"ftyp", b"iso6", struct.pack("!I", 0), b"iso6cmfcmp41")
+    return ftyp + moov
+
+
+def media_segment(sequence: int, base_time: int, samples: List[_Sample]):
+    """
+    moof and mdat for samples
+
+    The size is known up front, so the fragment is written into one
+    preallocated buffer and each NAL unit is copied exactly once.
+    """
+
+    trun_size = TRUN_STRUCT_SIZE + TRUN_SAMPLE_STRUCT_SIZE * len(samples)
+    traf_size = BOX_STRUCT_SIZE + TFHD_STRUCT_SIZE + TFDT_STRUCT_SIZE + trun_size
+    moof_size = BOX_STRUCT_SIZE + MFHD_STRUCT_SIZE + traf_size
+    mdat_size = BOX_STRUCT_SIZE + sum(sample.size for sample in samples)
+    buffer = bytearray(moof_size + mdat_size)
+
+    offset = 0
+    struct.pack_into(BOX_STRUCT, buffer, offset, moof_size, b"moof")
+    offset += BOX_STRUCT_SIZE
+    struct.pack_into(
+        MFHD_STRUCT, buffer, offset, MFHD_STRUCT_SIZE, b"mfhd", 0, sequence
+    )
+    offset += MFHD_STRUCT_SIZE
+    struct.pack_into(BOX_STRUCT, buffer, offset, traf_size, b"traf")
+    offset += BOX_STRUCT_SIZE
+    struct.pack_into(
+        TFHD_STRUCT,
+        buffer,
+        offset,
+        TFHD_STRUCT_SIZE,
+        b"tfhd",
+        TFHD_DEFAULT_BASE_IS_MOOF,
+        TRACK_ID,
+    )
+    offset += TFHD_STRUCT_SIZE
+    struct.pack_into(
+        TFDT_STRUCT, buffer, offset, TFDT_STRUCT_SIZE, b"tfdt", 1 << 24, base_time
+    )
+    offset += TFDT_STRUCT_SIZE
+    struct.pack_into(
+        TRUN_STRUCT,
+        buffer,
+        offset,
+        trun_size,
+        b"trun",
+        TRUN_FLAGS,
+        len(samples),
+        moof_size + BOX_STRUCT_SIZE,
+    )
+    offset += TRUN_STRUCT_SIZE
+    for sample in samples:
+        struct.pack_into(
+            TRUN_SAMPLE_STRUCT,
+            buffer,
+            offset,
+            sample.duration,
+            sample.size,
+            SAMPLE_FLAGS_SYNC if sample.keyframe else SAMPLE_FLAGS_NON_SYNC,
+        )
+        offset += TRUN_SAMPLE_STRUCT_SIZE
+
+    struct.pack_into(BOX_STRUCT, buffer, offset, mdat_size, b"mdat")
+    offset += BOX_STRUCT_SIZE
+    for sample in samples:
+        for unit in sample.units:
+            size = len(unit)
+            struct.pack_into(NAL_LENGTH_STRUCT, buffer, offset, size)
+            offset += NAL_LENGTH_SIZE
+            buffer[offset : offset + size] = unit
+            offset += size
+    return buffer
+
+
+class Fmp4Muxer:
+    """
+    Remuxes H.264 / H.265 preview frames into fragmented MP4
+
+    Annex B frames are rewritten as length prefixed samples, parameter sets
+    move into the init segment, nothing is decoded or re-encoded. Segments
+    start at a keyframe once segment_seconds have passed, with
+    part_seconds they are further split into LL-HLS parts. A change of
+    parameter sets (resolution or codec switch) ends the segment and starts
+    a new init segment.
+
+    Samples are in decode order with no composition offsets, the cameras do
+    not send B-frames.
+    """
+
+    def __init__(
+        self,
+        segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+        part_seconds: Optional[float] = None,
+    ):
+        self.segment_seconds = segment_seconds
+        self.part_seconds = part_seconds
+        self.codec: Optional[str] = None
+        self.codecs: Optional[str] = None
+        self.init: Optional[bytes] = None
+        self.inits = 0
+        self._info: Optional[Info] = None
+        self._parameter_sets: Optional[Tuple[bytes, ...]] = None
+        self._clock = MediaClock()
+        self._pending: Optional[_Sample] = None
+        self._samples: List[_Sample] = []
+        self._sequence = 0
+        self._segment = 0
+        self._part = 0
+        self._segment_start = 0
+        self._duration = TIMESCALE // 25
+
+    def push(self, frame: Frame) -> List[Fragment]:
+        """ add a frame, returns the fragments it completed """
+
+        if frame.kind == MediaKind.INFO:
+            self._info = frame.info
+            if not frame.info is None and frame.info.fps:
+                self._duration = TIMESCALE // frame.info.fps
+            return []
+        if not frame.video or not frame.codec in _PARAMETER_SETS:
+            return []
+
+        time = self._clock.update(frame) * TIMESCALE // US_PER_SECOND
+        units = nal_units(frame.payload)
+        skip = _OUT_OF_BAND[frame.codec]
+        changed = None
+        if frame.keyframe:
+            changed = self._find_parameter_sets(frame.codec, units)
+            if changed == (frame.codec, self._parameter_sets):
+                changed = None
+
+        fragments = []
+        pending = self._pending
+        self._pending = None
+        if not pending is None:
+            if time > pending.time:
+                self._duration = pending.duration = time - pending.time
+            else:
+                pending.duration = self._duration
+            if (
+                self.part_seconds
+                and self._samples
+                and (pending.time + pending.duration - self._part_start)
+                > self.part_seconds * TIMESCALE
+            ):
+                fragments.append(self._fragment(False))
+            self._samples.append(pending)
+
+        if self._samples and frame.keyframe and (
+            not changed is None
+            or time - self._segment_start >= self.segment_seconds * TIMESCALE
+        ):
+            fragments.append(self._fragment(True))
+
+        if not changed is None:
+            self._set_init(*changed)
+        if self.init is None:
+            return fragments
+
+        if not self._samples and self._part == 0:
+            self._segment_start = time
+        self._pending = _Sample(
+            [unit for unit in units if not nal_type(frame.codec, unit) in skip],
+            time,
+            frame.keyframe,
+        )
+        return fragments
+
+    def flush(self) -> List[Fragment]:
+        """ end the current segment, for use at the end of the stream """
+
+        if not self._pending is None:
+            self._pending.duration = self._duration
+            self._samples.append(self._pending)
+            self._pending = None
+        if not self._samples:
+            return []
+        return [self._fragment(True)]
+
+    @property
+    def _part_start(self):
+        return self._samples[0].time
+
+    def _find_parameter_sets(self, codec: str, units: List[memoryview]):
+        found = {}
+        for unit in units:
+            kind = nal_type(codec, unit)
+            if kind in _PARAMETER_SETS[codec] and not kind in found:
+                found[kind] = bytes(unit)
+        if len(found) < len(_PARAMETER_SETS[codec]):
+            return None
+        return (codec, tuple(found[kind] for kind in _PARAMETER_SETS[codec]))
+
+    def _set_init(self, codec: str, parameter_sets: Tuple[bytes, ...]):
+        (width, height) = (0, 0)
+        if not self._info is None:
+            (width, height) = (self._info.width, self._info.height)
+        self.codec = codec
+        self.codecs = codec_string(codec, parameter_sets)
+        self.init = init_segment(codec, parameter_sets, width, height)
+        self.inits += 1
+        self._parameter_sets = parameter_sets
+        _LOGGER.debug("New init segment %s %dx%d", self.codecs, width, height)
+
+    def _fragment(self, last: bool):
+        samples = self._samples
+        self._samples = []
+        self._sequence += 1
+        base_time = samples[0].time
+        fragment = Fragment(
+            self._sequence,
+            self._segment,
+            self._part,
+            base_time / TIMESCALE,
+            sum(sample.duration for sample in samples) / TIMESCALE,
+            samples[0].keyframe,
+            last,
+            self.inits,
+            media_segment(self._sequence, base_time, samples),
+        )
+        if last:
+            self._segment += 1
+            self._part = 0
+        else:
+            self._part += 1
+        return fragment
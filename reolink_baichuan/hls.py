@@ -0,0 +1,175 @@
+"""
+HLS Playlist
+"""
+
+import math
+
+from collections import deque
+from typing import AsyncIterable, Deque, Dict, List, Optional
+
+from .const import DEFAULT_PLAYLIST_WINDOW, DEFAULT_SEGMENT_SECONDS
+from .fmp4 import Fmp4Muxer, Fragment
+from .models.media import Frame
+
+PARTS_SEGMENTS = 3
+
+
+class _Segment:
+    __slots__ = ("sequence", "init", "parts", "duration", "complete", "data")
+
+    def __init__(self, sequence: int, init: int):
+        self.sequence = sequence
+        self.init = init
+        self.parts: List[Fragment] = []
+        self.duration = 0.0
+        self.complete = False
+        self.data: Optional[bytes] = None
+
+
+class HlsStream:
+    """
+    Rolling HLS / LL-HLS output for one camera stream
+
+    Frames are remuxed with an Fmp4Muxer and the last window segments are
+    kept in memory together with the init segments they reference. With
+    part_seconds the playlist lists LL-HLS parts for the newest segments,
+    blocking playlist reloads are left to the HTTP server.
+
+    Resources are named init{n}.mp4, seg{n}.m4s and seg{n}.{part}.m4s.
+    """
+
+    def __init__(
+        self,
+        segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+        part_seconds: Optional[float] = None,
+        window: int = DEFAULT_PLAYLIST_WINDOW,
+    ):
+        self.muxer = Fmp4Muxer(segment_seconds, part_seconds)
+        self.window = window
+        self._segments: Deque[_Segment] = deque()
+        self._inits: Dict[int, bytes] = {}
+        self._discontinuities = 0
+        self._max_duration = float(segment_seconds)
+
+    @property
+    def codecs(self):
+        """ CODECS attribute value for a master playlist """
+        return self.muxer.codecs
+
+    def push(self, frame: Frame):
+        """ add a frame """
+
+        # fragments completed by a parameter set change use the old init
+        self._track_init()
+        for fragment in self.muxer.push(frame):
+            self._add(fragment)
+        self._track_init()
+
+    def flush(self):
+        """ complete the current segment """
+
+        for fragment in self.muxer.flush():
+            self._add(fragment)
+
+    async def feed(self, frames: AsyncIterable[Frame]):
+        """ push frames until the iterable ends, e.g. Stream.frames() """
+
+        async for frame in frames:
+            self.push(frame)
+        self.flush()
+
+    def _track_init(self):
+        if not self.muxer.init is None:
+            self._inits.setdefault(self.muxer.inits, self.muxer.init)
+
+    def _add(self, fragment: Fragment):
+        if not self._segments or self._segments[-1].complete:
+            self._segments.append(_Segment(fragment.segment, fragment.init))
+        segment = self._segments[-1]
+        segment.parts.append(fragment)
+        segment.duration += fragment.duration
+        if fragment.last:
+            segment.complete = True
+            self._max_duration = max(self._max_duration, segment.duration)
+
+        while sum(1 for seg in self._segments if seg.complete) > self.window:
+            evicted = self._segments.popleft()
+            if self._segments and self._segments[0].init != evicted.init:
+                self._discontinuities += 1
+                self._inits.pop(evicted.init, None)
+
+    def get(self, name: str) -> Optional[bytes]:
+        """ init or media segment (or part) by playlist name """
+
+        (stem, _, ext) = name.rpartition(".")
+        if ext == "mp4" and stem.startswith("init"):
+            try:
+                return self._inits.get(int(stem[4:]))
+            except ValueError:
+                return None
+        if ext != "m4s" or not stem.startswith("seg"):
+            return None
+        (sequence, _, part) = stem[3:].partition(".")
+        try:
+            sequence = int(sequence)
+            part = int(part) if part else None
+        except ValueError:
+            return None
+
+        for segment in self._segments:
+            if segment.sequence != sequence:
+                continue
+            if not part is None:
+                if part < len(segment.parts):
+                    return segment.parts[part].data
+                return None
+            if not segment.complete:
+                return None
+            if segment.data is None:
+                segment.data = b"".join(fragment.data for fragment in segment.parts)
+            return segment.data
+        return None
+
+    def playlist(self) -> str:
+        """ media playlist text """
+
+        part_seconds = self.muxer.part_seconds
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:%d" % (9 if part_seconds else 7),
+            "#EXT-X-TARGETDURATION:%d" % math.ceil(self._max_duration),
+        ]
+        if part_seconds:
+            lines.append(
+                "#EXT-X-SERVER-CONTROL:PART-HOLD-BACK=%.3f" % (3 * part_seconds)
+            )
+            lines.append("#EXT-X-PART-INF:PART-TARGET=%.3f" % part_seconds)
+        segments = list(self._segments)
+        if segments:
+            lines.append("#EXT-X-MEDIA-SEQUENCE:%d" % segments[0].sequence)
+        lines.append("#EXT-X-DISCONTINUITY-SEQUENCE:%d" % self._discontinuities)
+        lines.append("#EXT-X-INDEPENDENT-SEGMENTS")
+
+        init = None
+        with_parts = len(segments) - PARTS_SEGMENTS
+        for idx, segment in enumerate(segments):
+            if segment.init != init:
+                if not init is None:
+                    lines.append("#EXT-X-DISCONTINUITY")
+                init = segment.init
+                lines.append('#EXT-X-MAP:URI="init%d.mp4"' % init)
+            if part_seconds and idx >= with_parts:
+                for fragment in segment.parts:
+                    lines.append(
+                        '#EXT-X-PART:DURATION=%.5f,URI="seg%d.%d.m4s"%s'
+                        % (
+                            fragment.duration,
+                            segment.sequence,
+                            fragment.part,
+                            ",INDEPENDENT=YES" if fragment.independent else "",
+                        )
+                    )
+            if segment.complete:
+                lines.append("#EXTINF:%.5f," % segment.duration)
+                lines.append("seg%d.m4s" % segment.sequence)
+        return "\n".join(lines) + "\n"
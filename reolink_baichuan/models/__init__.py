@@ -1,7 +1,24 @@
 """ Baichuan Protocol Models """
 
-from .message import Message
+from .message import Message, stream_index
+
+from .metadata import ClientIndex
+
+from .media import Frame, FrameHeader, MediaKind, MediaReader, MediaScanner
+
+from .tracing import OpenTelemetryTracer, Tracer, set_tracer
 
 from .legacy import Login as LegacyLogin
 
-from .modern.xml import Body as XmlBody, Extension as XmlExtension
\ No newline at end of file
+from .modern.xml import (
+    AudioConfig,
+    Body as XmlBody,
+    Extension as XmlExtension,
+    FileInfo,
+    PullParser as XmlPullParser,
+    SystemGeneral,
+    TalkConfig,
+    VersionInfo,
+)
+
+from .typings import BufferTypes, StreamId, StreamType
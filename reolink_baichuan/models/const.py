@@ -2,7 +2,16 @@
 
 MSG_ID_LOGIN = 1
 MSG_ID_VIDEO = 3
+MSG_ID_VIDEO_STOP = 4
+MSG_ID_DOWNLOAD_STOP = 7
+MSG_ID_DOWNLOAD = 8
+MSG_ID_TALK_RESET = 11
+MSG_ID_FILE_INFO_LIST_OPEN = 14
+MSG_ID_FILE_INFO_LIST_GET = 15
+MSG_ID_FILE_INFO_LIST_CLOSE = 16
 MSG_ID_VERSION = 80
 MSG_ID_PING = 93
 MSG_ID_GET_GENERAL = 104
 MSG_ID_SET_GENERAL = 105
+MSG_ID_TALK_CONFIG = 201
+MSG_ID_TALK = 202
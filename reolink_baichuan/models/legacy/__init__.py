@@ -28,15 +28,13 @@ class Login:
     username: str
     password: str = None
 
-    def __pack_to__(
+    def __pack_into__(
         self, meta: Metadata, buffer: WriteBufferTypes, offset: int = 0
     ) -> Tuple[int, Optional[int]]:
-        struct.pack_into(
+        buffer[offset : offset + LOGIN_STRUCT_SIZE] = struct.pack(
             LOGIN_STRUCT,
-            buffer,
-            offset,
-            self.username[:31],
-            self.password[:31] if not self.password else "",
+            self.username[:31].encode(),
+            self.password[:31].encode() if self.password else b"",
         )
         return (LOGIN_STRUCT_SIZE, None)
 
@@ -72,7 +70,9 @@ class Unknown:
 Legacy = Union[Unknown, Login]
 
 
-def unpack_from(meta: Metadata, buffer: BufferTypes, offset: int = 0) -> Legacy:
-    if meta.msg_id == MSG_ID_LOGIN:
-        return Login.__unpack_from__(buffer, offset)
-    return Unknown.__unpack_from__(buffer, offset)
\ No newline at end of file
+def unpack_from(
+    context: MetadataContext, buffer: BufferTypes, offset: int = 0
+) -> Legacy:
+    if context.metadata.msg_id == MSG_ID_LOGIN:
+        return Login.__unpack_from__(context, buffer, offset)[1]
+    return Unknown.__unpack_from__(context, buffer, offset)[1]
\ No newline at end of file
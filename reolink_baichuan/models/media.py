@@ -0,0 +1,399 @@
+""" Media (BcMedia) Frames """
+
+import struct
+
+from enum import IntEnum
+from typing import Container, Iterator, NamedTuple, Optional, Tuple
+
+from .typings import BufferTypes
+
+MAGIC_INFO_V1 = 0x31303031
+MAGIC_INFO_V2 = 0x32303031
+MAGIC_IFRAME = 0x63643030
+MAGIC_IFRAME_LAST = 0x63643039
+MAGIC_PFRAME = 0x63643130
+MAGIC_PFRAME_LAST = 0x63643139
+MAGIC_AAC = 0x62773530
+MAGIC_ADPCM = 0x62773130
+
+MAGIC_STRUCT = "<I"
+MAGIC_STRUCT_SIZE = struct.calcsize(MAGIC_STRUCT)
+
+INFO_STRUCT = "<IIIIBB6B6B2x"
+INFO_STRUCT_SIZE = struct.calcsize(INFO_STRUCT)
+
+VIDEO_STRUCT = "<I4sIIII"
+VIDEO_STRUCT_SIZE = struct.calcsize(VIDEO_STRUCT)
+
+AUDIO_STRUCT = "<IHH"
+AUDIO_STRUCT_SIZE = struct.calcsize(AUDIO_STRUCT)
+
+ADPCM_STRUCT = "<HH"
+ADPCM_STRUCT_SIZE = struct.calcsize(ADPCM_STRUCT)
+ADPCM_MAGIC = 0x0100
+
+PAD_SIZE = 8
+
+US_PER_SECOND = 1000000
+US_WRAP = 1 << 32
+
+
+class MediaKind(IntEnum):
+    """ Media Frame Kinds """
+
+    INFO = 0
+    IFRAME = 1
+    PFRAME = 2
+    AAC = 3
+    ADPCM = 4
+
+
+class Info(NamedTuple):
+    """ Stream Info """
+
+    width: int
+    height: int
+    fps: int
+
+
+class Frame(NamedTuple):
+    """ Media Frame """
+
+    kind: MediaKind
+    payload: memoryview
+    microseconds: Optional[int] = None
+    codec: Optional[str] = None
+    time: Optional[int] = None
+    info: Optional[Info] = None
+
+    @property
+    def keyframe(self):
+        """ Return True for frames a decoder can start from """
+        return self.kind == MediaKind.IFRAME
+
+    @property
+    def video(self):
+        """ Return True for video frames """
+        return self.kind in (MediaKind.IFRAME, MediaKind.PFRAME)
+
+
+class FrameHeader(NamedTuple):
+    """ Media Frame Header """
+
+    kind: MediaKind
+    size: int
+    microseconds: Optional[int] = None
+
+
+def _pad(size: int):
+    return (PAD_SIZE - size % PAD_SIZE) % PAD_SIZE
+
+
+def peek_kind(buffer: BufferTypes, offset: int = 0):
+    """ frame kind from the magic at offset, None if unknown or incomplete """
+
+    if len(buffer) - offset < MAGIC_STRUCT_SIZE:
+        return None
+    (magic,) = struct.unpack_from(MAGIC_STRUCT, buffer, offset)
+    return _kind(magic)
+
+
+def _kind(magic: int):
+    if MAGIC_IFRAME <= magic <= MAGIC_IFRAME_LAST:
+        return MediaKind.IFRAME
+    if MAGIC_PFRAME <= magic <= MAGIC_PFRAME_LAST:
+        return MediaKind.PFRAME
+    if magic == MAGIC_AAC:
+        return MediaKind.AAC
+    if magic == MAGIC_ADPCM:
+        return MediaKind.ADPCM
+    if magic in (MAGIC_INFO_V1, MAGIC_INFO_V2):
+        return MediaKind.INFO
+    return None
+
+
+def frame_size(
+    buffer: BufferTypes, offset: int = 0
+) -> Optional[Tuple[MediaKind, int]]:
+    """
+    (kind, total size) of the frame at offset from its header alone
+
+    Returns None when the header is incomplete, raises ValueError on an
+    unknown magic.
+    """
+
+    available = len(buffer) - offset
+    kind = peek_kind(buffer, offset)
+    if kind is None:
+        if available < MAGIC_STRUCT_SIZE:
+            return None
+        raise ValueError("Unknown media magic")
+
+    if kind == MediaKind.INFO:
+        return (kind, INFO_STRUCT_SIZE)
+    if kind in (MediaKind.IFRAME, MediaKind.PFRAME):
+        if available < VIDEO_STRUCT_SIZE:
+            return None
+        (_, _, payload_size, extra_size, _, _) = struct.unpack_from(
+            VIDEO_STRUCT, buffer, offset
+        )
+        return (
+            kind,
+            VIDEO_STRUCT_SIZE + extra_size + payload_size + _pad(payload_size),
+        )
+    if available < AUDIO_STRUCT_SIZE:
+        return None
+    (_, payload_size, _) = struct.unpack_from(AUDIO_STRUCT, buffer, offset)
+    return (kind, AUDIO_STRUCT_SIZE + payload_size + _pad(payload_size))
+
+
+def unpack_header(buffer: BufferTypes, offset: int = 0) -> Optional[FrameHeader]:
+    """ header of the frame at offset, None if incomplete (see frame_size) """
+
+    header = frame_size(buffer, offset)
+    if header is None:
+        return None
+    (kind, size) = header
+    microseconds = None
+    if kind in (MediaKind.IFRAME, MediaKind.PFRAME):
+        (_, _, _, _, microseconds, _) = struct.unpack_from(
+            VIDEO_STRUCT, buffer, offset
+        )
+    return FrameHeader(kind, size, microseconds)
+
+
+def unpack_from(buffer: BufferTypes, offset: int = 0) -> Tuple[int, Frame]:
+    """ unpack a complete frame at offset, payload is a view into buffer """
+
+    view = memoryview(buffer)
+    (magic,) = struct.unpack_from(MAGIC_STRUCT, view, offset)
+    kind = _kind(magic)
+
+    if kind == MediaKind.INFO:
+        _tuple = struct.unpack_from(INFO_STRUCT, view, offset)
+        info = Info(_tuple[2], _tuple[3], _tuple[5])
+        return (INFO_STRUCT_SIZE, Frame(kind, view[offset:offset], info=info))
+
+    if kind in (MediaKind.IFRAME, MediaKind.PFRAME):
+        (_, codec, payload_size, extra_size, microseconds, _) = struct.unpack_from(
+            VIDEO_STRUCT, view, offset
+        )
+        start = offset + VIDEO_STRUCT_SIZE
+        time = None
+        if kind == MediaKind.IFRAME and extra_size >= 4:
+            (time,) = struct.unpack_from("<I", view, start)
+        start += extra_size
+        size = start - offset + payload_size + _pad(payload_size)
+        return (
+            size,
+            Frame(
+                kind,
+                view[start : start + payload_size],
+                microseconds,
+                codec.decode("ascii"),
+                time,
+            ),
+        )
+
+    (_, payload_size, _) = struct.unpack_from(AUDIO_STRUCT, view, offset)
+    start = offset + AUDIO_STRUCT_SIZE
+    end = start + payload_size
+    if kind == MediaKind.ADPCM:
+        start += ADPCM_STRUCT_SIZE
+    size = AUDIO_STRUCT_SIZE + payload_size + _pad(payload_size)
+    return (size, Frame(kind, view[start:end]))
+
+
+def audio_header(kind: MediaKind, payload_size: int) -> Tuple[bytes, bytes]:
+    """
+    (header, padding) framing an outgoing audio payload
+
+    ADPCM payloads are DVI4 blocks including their 4 byte state header.
+    """
+
+    if kind == MediaKind.ADPCM:
+        size = payload_size + ADPCM_STRUCT_SIZE
+        header = struct.pack(AUDIO_STRUCT, MAGIC_ADPCM, size, size) + struct.pack(
+            ADPCM_STRUCT, ADPCM_MAGIC, (payload_size - 4) // 2
+        )
+    elif kind == MediaKind.AAC:
+        size = payload_size
+        header = struct.pack(AUDIO_STRUCT, MAGIC_AAC, size, size)
+    else:
+        raise ValueError(f"Not an audio kind: {kind}")
+    return (header, bytes(_pad(size)))
+
+
+class MediaClock:
+    """ Unwraps the 32 bit microsecond frame clock """
+
+    def __init__(self):
+        self._last: Optional[int] = None
+        self.now = 0
+
+    def update(self, frame: Frame):
+        """ monotonic microseconds for frame, untimed frames get the last time """
+
+        if frame.microseconds is None:
+            return self.now
+        if not self._last is None:
+            self.now += (frame.microseconds - self._last) % US_WRAP
+        self._last = frame.microseconds
+        return self.now
+
+
+KEYFRAMES = (MediaKind.INFO, MediaKind.IFRAME)
+
+
+class MediaReader:
+    """
+    Incremental BcMedia demuxer
+
+    Frames may span preview messages. A frame that lies within one fed buffer
+    is returned as a view of it, only frames split across buffers are copied.
+    When kinds is given, other frames are skipped from their header alone and
+    their payload is never copied or sliced.
+    """
+
+    def __init__(self, kinds: Optional[Container[MediaKind]] = None):
+        self._kinds = kinds
+        self._pending = bytearray()
+        self._size = 0
+        self._skip = 0
+
+    def feed(self, buffer: BufferTypes) -> Iterator[Frame]:
+        """ feed a binary payload and yield completed frames """
+
+        view = memoryview(buffer)
+        if self._skip:
+            skipped = min(self._skip, len(view))
+            self._skip -= skipped
+            view = view[skipped:]
+        if self._pending:
+            view = yield from self._resume(view)
+            if view is None:
+                return
+
+        offset = 0
+        end = len(view)
+        while offset < end:
+            try:
+                header = frame_size(view, offset)
+            except ValueError:
+                # lost sync, skip ahead until a known magic lines up
+                offset += 1
+                continue
+            if header is None:
+                break
+            (kind, size) = header
+            if not self._kinds is None and not kind in self._kinds:
+                if offset + size > end:
+                    self._skip = offset + size - end
+                    offset = end
+                    break
+                offset += size
+                continue
+            if offset + size > end:
+                self._size = size
+                break
+            (size, frame) = unpack_from(view, offset)
+            offset += size
+            yield frame
+
+        if offset < end:
+            self._pending += view[offset:]
+
+    def _resume(self, view: memoryview):
+        # a split frame is gathered up to its size and copied once complete,
+        # returns the rest of view or None when it is all taken
+        if not self._size:
+            self._pending += view
+            view = view[len(view) :]
+            try:
+                header = frame_size(self._pending)
+            except ValueError:
+                # lost sync, rescan from the kept bytes
+                data = bytes(self._pending)
+                self._pending.clear()
+                return memoryview(data)
+            if header is None:
+                return None
+            (kind, self._size) = header
+            if len(self._pending) > self._size:
+                view = memoryview(self._pending[self._size :])
+                del self._pending[self._size :]
+            if not self._kinds is None and not kind in self._kinds:
+                self._skip = self._size - len(self._pending)
+                self._pending.clear()
+                self._size = 0
+                return view
+        else:
+            take = min(self._size - len(self._pending), len(view))
+            self._pending += view[:take]
+            view = view[take:]
+        if len(self._pending) < self._size:
+            return None
+
+        data = bytes(self._pending)
+        self._pending.clear()
+        self._size = 0
+        (_, frame) = unpack_from(data, 0)
+        yield frame
+        return view
+
+
+class MediaScanner:
+    """
+    Incremental BcMedia header walker
+
+    Yields the header of every frame fed, frame data is skipped without
+    being sliced or copied. Only a header split across buffers is kept.
+    """
+
+    def __init__(self):
+        self._pending = bytearray()
+        self._skip = 0
+
+    def feed(self, buffer: BufferTypes) -> Iterator[FrameHeader]:
+        """ feed a binary payload and yield the frame headers it starts """
+
+        view = memoryview(buffer)
+        if self._skip:
+            skipped = min(self._skip, len(view))
+            self._skip -= skipped
+            view = view[skipped:]
+
+        offset = 0
+        end = len(view)
+        if self._pending and end:
+            pending = len(self._pending)
+            head = bytes(self._pending) + bytes(view[:VIDEO_STRUCT_SIZE])
+            self._pending.clear()
+            try:
+                header = unpack_header(head)
+            except ValueError:
+                # lost sync, resume at the start of this buffer
+                header = None
+                head = b""
+            if header is None and head:
+                self._pending += head
+                return
+            if not header is None:
+                yield header
+                offset = header.size - pending
+
+        while offset < end:
+            try:
+                header = unpack_header(view, offset)
+            except ValueError:
+                offset += 1
+                continue
+            if header is None:
+                break
+            yield header
+            offset += header.size
+
+        if offset > end:
+            self._skip = offset - end
+        elif offset < end:
+            self._pending += view[offset:]
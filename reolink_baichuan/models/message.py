@@ -1,13 +1,23 @@
 """ Baichuan Protocol Message """
 
 from dataclasses import dataclass
-from typing import Awaitable, Callable, Optional, Union
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Union
 
 from .const import (
+    MSG_ID_DOWNLOAD,
+    MSG_ID_DOWNLOAD_STOP,
+    MSG_ID_FILE_INFO_LIST_CLOSE,
+    MSG_ID_FILE_INFO_LIST_GET,
+    MSG_ID_FILE_INFO_LIST_OPEN,
     MSG_ID_GET_GENERAL,
     MSG_ID_PING,
+    MSG_ID_TALK,
+    MSG_ID_TALK_CONFIG,
+    MSG_ID_TALK_RESET,
     MSG_ID_VERSION,
     MSG_ID_VIDEO,
+    MSG_ID_VIDEO_STOP,
 )
 
 from .metadata import (
@@ -16,12 +26,14 @@ from .metadata import (
     MSG_CLASS_MODERN,
     MSG_CLASS_MODERN_BINARY,
     MSG_CLASS_MODERN_OTHER,
+    ClientIndex,
     Metadata,
+    MetadataContext,
 )
 
-from .typings import BufferTypes, StreamType
+from .typings import BufferTypes, StreamId, StreamType
 
-from . import legacy
+from . import legacy, tracing
 from .modern import Modern, xml
 
 Body = Union[legacy.Legacy, Modern]
@@ -37,7 +49,36 @@ class Message:
     def tobytes(self):
         """ convert message to bytes """
 
-        self.meta.msg_id = self.body.__msg_id__
+        return bytes(self._pack(True))
+
+    def tobuffers(self) -> List[BufferTypes]:
+        """
+        convert message to buffers for writelines
+
+        The header and xml are packed, binary payload buffers are passed
+        through without being copied.
+        """
+
+        buffers: List[BufferTypes] = [self._pack(False)]
+        if isinstance(self.body, Modern) and self.meta.msg_class != MSG_CLASS_MODERN:
+            buffers.extend(self.body.binary_parts())
+        return buffers
+
+    def _pack(self, copy_binary: bool):
+        tracer = tracing.TRACER
+        if tracer is None:
+            return self._pack_buffer(copy_binary)
+        span = tracer.start(tracing.SPAN_ENCODE, self.meta.msg_id)
+        size = None
+        try:
+            buffer = self._pack_buffer(copy_binary)
+            size = len(buffer)
+        finally:
+            tracer.end(span, size)
+        return buffer
+
+    def _pack_buffer(self, copy_binary: bool):
+        self.meta.msg_id = self.meta.msg_id or self.body.__msg_id__
         self.meta.msg_class = self.body.__msg_class__
         offset = HEADER_STRUCT_SIZE
         if (
@@ -46,23 +87,37 @@ class Message:
             and self.meta.msg_class in (MSG_CLASS_MODERN_BINARY, MSG_CLASS_MODERN_OTHER)
         ):
             offset += 4
-        buffer = bytearray()
-        (body_len, bin_offset) = self.body.__pack_into__(self.meta, buffer, offset)
+        buffer = bytearray(offset)
+        if isinstance(self.body, Modern):
+            (body_len, bin_offset) = self.body.__pack_into__(
+                self.meta, buffer, offset, copy_binary
+            )
+        else:
+            (body_len, bin_offset) = self.body.__pack_into__(self.meta, buffer, offset)
         self.meta.__pack_into__(buffer, body_len, bin_offset)
-        return bytes(buffer)
+        return buffer
 
     @classmethod
-    async def async_read(cls, read: Callable[[int], Awaitable[bytes]]):
-        """ fetch bytes and convert to Message """
+    async def async_read(
+        cls, read: Callable[[int], Awaitable[bytes]], parse: bool = True
+    ):
+        """ fetch bytes and convert to Message, optionally deferring xml parsing """
 
         context = await Metadata.async_read(read)
-        data = await read(context.body_len)
-        body: Body = None
-        if _is_modern(context.metadata):
-            body = Modern.__unpack_from__(context, data)
-        else:
-            body = legacy.unpack_from(context, data)
-
+        tracer = tracing.TRACER
+        if tracer is None:
+            data = await read(context.body_len)
+            return cls(context.metadata, _unpack_body(context, data, parse))
+        span = tracer.start(
+            tracing.SPAN_READ, context.metadata.msg_id, context.body_len
+        )
+        size = None
+        try:
+            data = await read(context.body_len)
+            body = _unpack_body(context, data, parse)
+            size = len(data)
+        finally:
+            tracer.end(span, size)
         return cls(context.metadata, body)
 
     @classmethod
@@ -79,16 +134,23 @@ class Message:
         """ Modern Xml Message """
 
         body = Modern(xml_, binary)
-        meta = Metadata(body.__msg_id__, body.__msg_class__, encrypted=encrypt)
+        meta = Metadata(body.__msg_id__, msg_class=body.__msg_class__, encrypted=encrypt)
         return cls(meta, body)
 
     @classmethod
-    def login(cls, username: str, password: Optional[str] = None, encrypt: bool = True):
+    def login(
+        cls,
+        username: str,
+        password: Optional[str] = None,
+        encrypt: bool = True,
+        udp_port: int = 0,
+    ):
         """ Modern Login Message """
 
         return cls.from_xml(
             xml.Body(
-                login_user=xml.LoginUser(username, password), login_net=xml.LoginNet()
+                login_user=xml.LoginUser(username, password),
+                login_net=xml.LoginNet(udp_port=udp_port),
             ),
             encrypt=encrypt,
         )
@@ -97,26 +159,207 @@ class Message:
     def ping(cls, encrypt: bool = True):
         """ Ping Message """
 
-        return cls(Metadata(MSG_ID_PING, 0, MSG_CLASS_MODERN, encrypt), Modern())
+        return cls(Metadata(MSG_ID_PING, ClientIndex(), MSG_CLASS_MODERN, encrypt), Modern())
 
     @classmethod
     def version(cls, encrypt: bool = True):
         """ Version Message """
 
-        return cls(Metadata(MSG_ID_VERSION, 0, MSG_CLASS_MODERN, encrypt), Modern())
+        return cls(Metadata(MSG_ID_VERSION, ClientIndex(), MSG_CLASS_MODERN, encrypt), Modern())
 
     @classmethod
-    def preview(cls, channel_id: int = 0, stream_type: StreamType = StreamType.MAIN, encrypt: bool = True):
+    def preview(
+        cls,
+        channel_id: int = 0,
+        stream_type: StreamType = StreamType.MAIN,
+        handle: int = 0,
+        encrypt: bool = True,
+    ):
         """ Preview Message """
 
-        preview = xml.Preview(channel_id, stream_type=stream_type)
-        return cls(Metadata(MSG_ID_VIDEO, 0, MSG_CLASS_MODERN, encrypt), Modern(preview))
+        preview = xml.Preview(channel_id, handle, stream_type)
+        client_idx = stream_index(channel_id, stream_type, handle)
+        return cls(
+            Metadata(MSG_ID_VIDEO, client_idx, MSG_CLASS_MODERN, encrypt),
+            Modern(xml.Body(preview=preview)),
+        )
+
+    @classmethod
+    def preview_stop(
+        cls,
+        channel_id: int = 0,
+        stream_type: StreamType = StreamType.MAIN,
+        handle: int = 0,
+        encrypt: bool = True,
+    ):
+        """ Preview Stop Message """
+
+        preview = xml.Preview(channel_id, handle, stream_type)
+        client_idx = stream_index(channel_id, stream_type, handle)
+        return cls(
+            Metadata(MSG_ID_VIDEO_STOP, client_idx, MSG_CLASS_MODERN, encrypt),
+            Modern(xml.Body(preview=preview)),
+        )
 
     @classmethod
     def general(cls, encrypt: bool = True):
         """ General Message """
 
-        return cls(Metadata(MSG_ID_GET_GENERAL, 0, MSG_CLASS_MODERN, encrypt), Modern())
+        return cls(Metadata(MSG_ID_GET_GENERAL, ClientIndex(), MSG_CLASS_MODERN, encrypt), Modern())
+
+    @classmethod
+    def set_general(cls, general: xml.SystemGeneral, encrypt: bool = True):
+        """ Set General Message """
+
+        return cls.from_xml(xml.Body(system_general=general), encrypt=encrypt)
+
+    @classmethod
+    def talk_config(
+        cls, channel_id: int, audio_config: xml.AudioConfig, encrypt: bool = True
+    ):
+        """
+        Talk Config Message
+
+        The config is the payload after a channel Extension, it is encrypted
+        here as the binary part is sent as is.
+        """
+
+        client_idx = ClientIndex(channel_id)
+        payload = xml.serialize(
+            xml.Body(talk_config=xml.TalkConfig(channel_id, audio_config=audio_config))
+        )
+        if encrypt:
+            payload = xml.crypto(payload, client_idx.__to_int__())
+        return cls(
+            Metadata(MSG_ID_TALK_CONFIG, client_idx, MSG_CLASS_MODERN_BINARY, encrypt),
+            Modern(xml.Extension(channel_id=channel_id), payload),
+        )
+
+    @classmethod
+    def talk(cls, channel_id: int, binary: BufferTypes, encrypt: bool = True):
+        """ Talk Audio Message, binary may be a sequence of buffers """
+
+        return cls(
+            Metadata(
+                MSG_ID_TALK, ClientIndex(channel_id), MSG_CLASS_MODERN_BINARY, encrypt
+            ),
+            Modern(xml.Extension(binary=1, channel_id=channel_id), binary),
+        )
+
+    @classmethod
+    def talk_reset(cls, channel_id: int, encrypt: bool = True):
+        """ Talk Reset Message """
+
+        return cls(
+            Metadata(MSG_ID_TALK_RESET, ClientIndex(channel_id), MSG_CLASS_MODERN, encrypt),
+            Modern(xml.Extension(channel_id=channel_id)),
+        )
+
+    @classmethod
+    def _file_info(
+        cls,
+        msg_id: int,
+        file_info: xml.FileInfo,
+        encrypt: bool = True,
+        client_idx: Optional[ClientIndex] = None,
+    ):
+        body = xml.Body(file_info_list=xml.FileInfoList(file_info))
+        meta = Metadata(msg_id, msg_class=MSG_CLASS_MODERN, encrypted=encrypt)
+        if not client_idx is None:
+            meta.client_idx = client_idx
+        return cls(meta, Modern(body))
+
+    @classmethod
+    def file_info_list_open(
+        cls,
+        channel_id: int,
+        start: datetime,
+        end: datetime,
+        stream_type: StreamType = StreamType.MAIN,
+        record_type: str = "manual, sched, md, pir, io",
+        encrypt: bool = True,
+    ):
+        """ Recording Search Open Message """
+
+        file_info = xml.FileInfo(
+            channel_id,
+            stream_type=stream_type.value,
+            record_type=record_type,
+            start_time=xml.Time.from_datetime(start),
+            end_time=xml.Time.from_datetime(end),
+        )
+        return cls._file_info(MSG_ID_FILE_INFO_LIST_OPEN, file_info, encrypt)
+
+    @classmethod
+    def file_info_list_get(
+        cls, channel_id: int, handle: int, client_handle: int = 0, encrypt: bool = True
+    ):
+        """ Recording Search Page Message, client_handle routes the reply """
+
+        client_idx = ClientIndex(channel_id, handle=client_handle)
+        file_info = xml.FileInfo(channel_id, handle=handle)
+        return cls._file_info(MSG_ID_FILE_INFO_LIST_GET, file_info, encrypt, client_idx)
+
+    @classmethod
+    def file_info_list_close(cls, channel_id: int, handle: int, encrypt: bool = True):
+        """ Recording Search Close Message """
+
+        file_info = xml.FileInfo(channel_id, handle=handle)
+        return cls._file_info(MSG_ID_FILE_INFO_LIST_CLOSE, file_info, encrypt)
+
+    @classmethod
+    def download(
+        cls, file_info: xml.FileInfo, handle: int = 0, encrypt: bool = True
+    ):
+        """ Recording Download Message """
+
+        client_idx = ClientIndex(file_info.channel_id, handle=handle)
+        file_info = xml.FileInfo(
+            file_info.channel_id, name=file_info.name, stream_type=file_info.stream_type
+        )
+        return cls._file_info(MSG_ID_DOWNLOAD, file_info, encrypt, client_idx)
+
+    @classmethod
+    def download_stop(
+        cls, file_info: xml.FileInfo, handle: int = 0, encrypt: bool = True
+    ):
+        """ Recording Download Stop Message """
+
+        client_idx = ClientIndex(file_info.channel_id, handle=handle)
+        file_info = xml.FileInfo(
+            file_info.channel_id, name=file_info.name, stream_type=file_info.stream_type
+        )
+        return cls._file_info(MSG_ID_DOWNLOAD_STOP, file_info, encrypt, client_idx)
+
+    def parse(self):
+        """ parse xml body deferred by async_read """
+
+        if isinstance(self.body, Modern) and self.body.xml is None and self.body.raw:
+            tracer = tracing.TRACER
+            if tracer is None:
+                self.body.xml = xml.parse(self.body.raw)
+                return self
+            span = tracer.start(tracing.SPAN_PARSE, self.meta.msg_id)
+            size = None
+            try:
+                self.body.xml = xml.parse(self.body.raw)
+                size = len(self.body.raw)
+            finally:
+                tracer.end(span, size)
+        return self
+
+
+def stream_index(channel_id: int, stream_type: StreamType, handle: int = 0):
+    """ ClientIndex used to route a preview stream """
+
+    stream = StreamId.CLEAR if stream_type == StreamType.MAIN else StreamId.FLUENT
+    return ClientIndex(channel_id, stream, handle)
+
+
+def _unpack_body(context: MetadataContext, data: bytes, parse: bool) -> Body:
+    if _is_modern(context.metadata):
+        return Modern.__unpack_from__(context, data, parse=parse)
+    return legacy.unpack_from(context, data)
 
 
 def _is_modern(self: Metadata):
@@ -5,7 +5,7 @@ import struct
 from dataclasses import dataclass, field
 from typing import Awaitable, Callable, NamedTuple, Optional
 
-from .typings import StreamType, BufferTypes, WriteBufferTypes
+from .typings import StreamId, BufferTypes, WriteBufferTypes
 
 MSG_CLASS_LEGACY = 0x6514
 MSG_CLASS_MODERN = 0x6614
@@ -16,6 +16,9 @@ MAGIC_HEADER = 0xABCDEF0
 HEADER_STRUCT = "!IIIIBBH"
 HEADER_STRUCT_SIZE = struct.calcsize(HEADER_STRUCT)
 
+# replies carry a little endian response code where requests carry flags
+RESPONSE_BAD_REQUEST = 400
+
 
 def has_bin_offset(msg_class: int):
     """ determine if class should have binday data """
@@ -31,20 +34,25 @@ class _ClientIndex(NamedTuple):
 
     channel_id: int
     stream: int
-    unused: int
+    msg_num: int
     handle: int
 
 
 @dataclass
 class ClientIndex:
-    """ Client Identifier """
+    """ Client Identifier
+
+    handle tells streams apart, msg_num tells requests apart, both are echoed
+    in replies.
+    """
 
     channel_id: int = 0
-    stream: StreamType = StreamType.BALANCED
+    stream: StreamId = StreamId.BALANCED
     handle: int = 0
+    msg_num: int = 0
 
     def __pack_into__(self, buffer: WriteBufferTypes, offset: int = 0):
-        _tuple = _ClientIndex(self.channel_id, self.stream, 0, self.handle)
+        _tuple = _ClientIndex(self.channel_id, self.stream, self.msg_num, self.handle)
         struct.pack_into(CLIENT_ID_STRUCT, buffer, offset, *_tuple)
         return CLIENT_ID_STRUCT_SIZE
 
@@ -58,7 +66,7 @@ class ClientIndex:
         _tuple = _ClientIndex(*struct.unpack_from(CLIENT_ID_STRUCT, buffer, offset))
         return (
             CLIENT_ID_STRUCT_SIZE,
-            cls(_tuple.channel_id, _tuple.stream, _tuple.handle),
+            cls(_tuple.channel_id, _tuple.stream, _tuple.handle, _tuple.msg_num),
         )
 
     @classmethod
@@ -88,6 +96,12 @@ class Metadata:
     client_idx: ClientIndex = field(default_factory=ClientIndex)
     msg_class: int = 0
     encrypted: bool = False
+    response_code: int = 0
+
+    @property
+    def rejected(self):
+        """ Return True if a reply reports an error response code """
+        return self.response_code >= RESPONSE_BAD_REQUEST
 
     def __pack_into__(
         self,
@@ -121,9 +135,9 @@ class Metadata:
         size = HEADER_STRUCT_SIZE
         offset += size
         bin_offset: Optional[int] = None
-        if _Header.msg_class in (MSG_CLASS_MODERN_BINARY, MSG_CLASS_MODERN_OTHER):
-            if size + 4 < len(buffer):
-                bin_offset = int.from_bytes(memoryview(buffer)[offset:4])
+        if _tuple.msg_class in (MSG_CLASS_MODERN_BINARY, MSG_CLASS_MODERN_OTHER):
+            if offset + 4 <= len(buffer):
+                bin_offset = int.from_bytes(memoryview(buffer)[offset : offset + 4])
                 size += 4
             else:
                 bin_offset = -1
@@ -135,6 +149,7 @@ class Metadata:
                 ClientIndex.__from_int__(_tuple.enc_offset),
                 _tuple.msg_class,
                 _tuple.encrypted,
+                _tuple.encrypted | _tuple.unknown << 8,
             ),
             _tuple.body_len,
             bin_offset,
@@ -1,7 +1,7 @@
 """ Modern Messages """
 
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
 from ..metadata import (
     MSG_CLASS_MODERN,
     MSG_CLASS_MODERN_BINARY,
@@ -10,6 +10,7 @@ from ..metadata import (
 )
 from ..const import MSG_ID_LOGIN, MSG_ID_SET_GENERAL
 from ..typings import BufferTypes, WriteBufferTypes
+from .. import tracing
 
 from . import xml
 
@@ -33,50 +34,97 @@ class Modern:
             return MSG_CLASS_MODERN
         return MSG_CLASS_MODERN_BINARY
 
-    xml: xml.Xml = None
+    xml: "xml.Xml" = None
     binary: BufferTypes = None
+    raw: BufferTypes = field(default=None, repr=False, compare=False)
 
-    def __pack_into__(self, meta: Metadata, buffer: WriteBufferTypes, offset: int = 0):
-        xml_buffer = buffer
-        xml_offset = offset
-        if meta.encrypted:
-            xml_buffer = bytearray()
-            xml_offset = 0
-        wrote: int = (
-            self.xml.__serialize_to__(xml_buffer, xml_offset)
-            if not self.xml is None
-            else 0
-        )
-        if meta.encrypted and wrote > 0:
-            xml.crypto(xml_buffer, meta.client_idx.__to_int__())
-            memoryview(buffer)[offset : offset + wrote] = xml_buffer
+    def __pack_into__(
+        self,
+        meta: Metadata,
+        buffer: WriteBufferTypes,
+        offset: int = 0,
+        copy_binary: bool = True,
+    ):
+        xml_data = xml.serialize(self.xml) if not self.xml is None else b""
+        if meta.encrypted and xml_data:
+            tracer = tracing.TRACER
+            key = meta.client_idx.__to_int__()
+            if tracer is None:
+                xml_data = xml.crypto(xml_data, key)
+            else:
+                span = tracer.start(tracing.SPAN_ENCRYPT, meta.msg_id, len(xml_data))
+                size = None
+                try:
+                    xml_data = xml.crypto(xml_data, key)
+                    size = len(xml_data)
+                finally:
+                    tracer.end(span, size)
+        wrote = len(xml_data)
+        buffer[offset : offset + wrote] = xml_data
         offset += wrote
         bin_offset: Optional[int] = wrote
         if self.binary is None or self.__msg_class__ == MSG_CLASS_MODERN:
             bin_offset = None
         if not bin_offset is None:
-            bin_len = len(self.binary)
-            memoryview(buffer)[offset : offset + bin_len] = self.binary
-            wrote += bin_len
+            for part in self.binary_parts():
+                bin_len = len(part)
+                if copy_binary:
+                    buffer[offset : offset + bin_len] = part
+                    offset += bin_len
+                wrote += bin_len
         return (wrote, bin_offset)
 
+    def binary_parts(self) -> Tuple[BufferTypes, ...]:
+        """ binary payload as buffers, outgoing binary may be a sequence """
+
+        if self.binary is None:
+            return ()
+        if isinstance(self.binary, (list, tuple)):
+            return tuple(self.binary)
+        return (self.binary,)
+
     @classmethod
     def __unpack_from__(
         cls,
         context: MetadataContext,
         buffer: BufferTypes,
         offset: int = 0,
+        parse: bool = True,
     ):
+        """ unpack body, leaving xml unparsed in `raw` when parse is False """
+
         xml_data = buffer
         xml_end = len(buffer)
         if not context.bin_offset is None:
             xml_end = context.bin_offset
+        tracer = tracing.TRACER
+        msg_id = context.metadata.msg_id
         if context.metadata.encrypted:
-            xml_data = xml.crypto(
-                memoryview(xml_data)[:xml_end], context.metadata.client_idx.__to_int__()
-            )
+            key = context.metadata.client_idx.__to_int__()
+            if tracer is None:
+                xml_data = xml.crypto(memoryview(xml_data)[:xml_end], key)
+            else:
+                span = tracer.start(tracing.SPAN_DECRYPT, msg_id, xml_end)
+                size = None
+                try:
+                    xml_data = xml.crypto(memoryview(xml_data)[:xml_end], key)
+                    size = len(xml_data)
+                finally:
+                    tracer.end(span, size)
             xml_end = len(xml_data)
-        xml_ = xml.parse(memoryview(xml_data)[:xml_end])
+        raw = memoryview(xml_data)[:xml_end]
+        xml_ = None
+        if parse and xml_end > 0:
+            if tracer is None:
+                xml_ = xml.parse(raw)
+            else:
+                span = tracer.start(tracing.SPAN_PARSE, msg_id, xml_end)
+                size = None
+                try:
+                    xml_ = xml.parse(raw)
+                    size = xml_end
+                finally:
+                    tracer.end(span, size)
 
         binary = (
             memoryview(buffer)[offset + context.bin_offset :]
@@ -84,4 +132,4 @@ class Modern:
             else None
         )
 
-        return cls(xml_, binary)
+        return cls(xml_, binary, raw)
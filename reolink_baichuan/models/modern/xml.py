@@ -1,11 +1,16 @@
 """ Xml Models """
 
-from dataclasses import dataclass, fields
+from dataclasses import MISSING, dataclass, fields
 from typing import (
     ClassVar,
     Dict,
+    Generic,
     Iterable,
+    Iterator,
+    List,
     Optional,
+    Tuple,
+    Type,
     TypeVar,
     Union,
     cast,
@@ -13,7 +18,10 @@ from typing import (
     get_type_hints,
 )
 
+from datetime import datetime
+from enum import Enum
 import xml.etree.ElementTree as etree
+from xml.parsers import expat
 
 from ..typings import BufferTypes, StreamType
 
@@ -139,6 +147,15 @@ class SystemGeneral:
         "time_format": "timeFormat",
         "device_name": "deviceName",
     }
+    # the camera clock, read back different on every request
+    _volatile: ClassVar[Tuple[str, ...]] = (
+        "year",
+        "month",
+        "day",
+        "hour",
+        "minute",
+        "second",
+    )
 
     timezone: int = None
     year: int = None
@@ -166,6 +183,110 @@ class Norm:
     version: str = VERSION
 
 
+@dataclass
+class Time:
+    """ Time """
+
+    year: int
+    month: int
+    day: int
+    hour: int = 0
+    minute: int = 0
+    second: int = 0
+
+    @classmethod
+    def from_datetime(cls, value: datetime):
+        """ Time from datetime """
+
+        return cls(
+            value.year, value.month, value.day, value.hour, value.minute, value.second
+        )
+
+    def to_datetime(self):
+        """ convert to datetime """
+
+        return datetime(
+            self.year, self.month, self.day, self.hour, self.minute, self.second
+        )
+
+
+@dataclass
+class FileInfo:
+    """ File Info (recording search entry) """
+
+    _elements: ClassVar[Dict[str, str]] = {
+        "channel_id": "channelId",
+        "stream_type": "streamType",
+        "record_type": "recordType",
+        "start_time": "StartTime",
+        "end_time": "EndTime",
+    }
+
+    channel_id: int = 0
+    handle: int = None
+    name: str = None
+    size: int = None
+    stream_type: str = None
+    record_type: str = None
+    start_time: Time = None
+    end_time: Time = None
+
+
+@dataclass
+class FileInfoList:
+    """ File Info List """
+
+    _attributes: ClassVar[Dict[str, str]] = {
+        "version": "version",
+    }
+    _elements: ClassVar[Dict[str, str]] = {
+        "file_info": "FileInfo",
+    }
+
+    file_info: FileInfo = None
+    version: str = VERSION
+
+
+@dataclass
+class AudioConfig:
+    """ Audio Config """
+
+    _elements: ClassVar[Dict[str, str]] = {
+        "audio_type": "audioType",
+        "sample_rate": "sampleRate",
+        "sample_precision": "samplePrecision",
+        "length_per_encoder": "lengthPerEncoder",
+        "sound_track": "soundTrack",
+    }
+
+    priority: int = 0
+    audio_type: str = "adpcm"
+    sample_rate: int = 16000
+    sample_precision: int = 16
+    length_per_encoder: int = 1024
+    sound_track: str = "mono"
+
+
+@dataclass
+class TalkConfig:
+    """ Talk Config """
+
+    _attributes: ClassVar[Dict[str, str]] = {
+        "version": "version",
+    }
+    _elements: ClassVar[Dict[str, str]] = {
+        "channel_id": "channelId",
+        "audio_stream_mode": "audioStreamMode",
+        "audio_config": "audioConfig",
+    }
+
+    channel_id: int = 0
+    duplex: str = "FDX"
+    audio_stream_mode: str = "followVideoStream"
+    audio_config: AudioConfig = None
+    version: str = VERSION
+
+
 @dataclass
 class Body:
     """ Xml Body """
@@ -181,6 +302,8 @@ class Body:
         "preview": "Preview",
         "system_general": "SystemGeneral",
         "norm": "Norm",
+        "file_info_list": "FileInfoList",
+        "talk_config": "TalkConfig",
     }
 
     encryption: Encryption = None
@@ -191,20 +314,28 @@ class Body:
     preview: Preview = None
     system_general: SystemGeneral = None
     norm: Norm = None
+    file_info_list: FileInfoList = None
+    talk_config: TalkConfig = None
 
 
 @dataclass
 class Extension:
     """ Xml Extension """
 
+    _attributes: ClassVar[Dict[str, str]] = {
+        "version": "version",
+    }
     _elements: ClassVar[Dict[str, str]] = {
         "binary": "binaryData",
+        "channel_id": "channelId",
     }
 
-    binary: BufferTypes
+    binary: int = None
+    channel_id: int = None
+    version: str = VERSION
 
 
-XML_KEY = bytes(0x1F, 0x2D, 0x3C, 0x4B, 0x5A, 0x69, 0x78, 0xFF)
+XML_KEY = bytes((0x1F, 0x2D, 0x3C, 0x4B, 0x5A, 0x69, 0x78, 0xFF))
 
 T = TypeVar("T")
 
@@ -219,6 +350,10 @@ for t in get_args(Xml):
 TO_STR = (int, bool, float, str)
 
 
+def _is_text(type_: type):
+    return type_ in TO_STR or (isinstance(type_, type) and issubclass(type_, Enum))
+
+
 def _from_xml(self: etree.Element, type_: type):
     attrs: Dict[str, str] = getattr(type_, "_attributes", None)
     elems: Dict[str, str] = getattr(type_, "_elements", None)
@@ -234,7 +369,7 @@ def _from_xml(self: etree.Element, type_: type):
             attr_value = self.find(field.name)
 
         if not attr_value is None:
-            if field.type in TO_STR and etree.iselement(attr_value):
+            if _is_text(field.type) and etree.iselement(attr_value):
                 attr_value = field.type(attr_value.text)
             elif etree.iselement(attr_value):
                 attr_value = _from_xml(attr_value, field.type)
@@ -242,13 +377,13 @@ def _from_xml(self: etree.Element, type_: type):
         if attr_value is None:
             _fields[field.name] = (
                 field.default_factory()
-                if not field.default_factory is None
+                if not field.default_factory is MISSING
                 else field.default
             )
         else:
             _fields[field.name] = attr_value
 
-    return type_(None, **_fields)
+    return type_(**_fields)
 
 
 def parse(buffer: BufferTypes):
@@ -260,6 +395,133 @@ def parse(buffer: BufferTypes):
     return cast(Xml, _from_xml(root, type_))
 
 
+PULL_CHUNK_SIZE = 64 * 1024
+
+
+class PullParser(Generic[T]):
+    """ Incremental Xml Parser
+
+    Produces typed entries for every `tag` element as soon as it is closed and
+    drops it from the tree afterwards, so memory stays flat regardless of the
+    reply size. Buffers may be continuations of one document or consecutive
+    documents (one per message), a buffer may also hold the end of one
+    document and the start of the next.
+    """
+
+    def __init__(self, type_: Type[T], tag: Optional[str] = None):
+        self._type = type_
+        self._tag = tag if not tag is None else getattr(type_, "_root", type_.__name__)
+        self._parser: Optional[etree.XMLPullParser] = None
+        self._scanner: Optional[expat.XMLParserType] = None
+        self._scanned = 0
+        self._depth = 0
+        self._root_end: Optional[int] = None
+        self._stack: List[etree.Element] = []
+
+    @property
+    def complete(self):
+        """ True when no document is partially parsed """
+        return self._parser is None
+
+    def feed(self, buffer: BufferTypes) -> Iterator[T]:
+        """ feed buffer to parser and yield entries as they complete """
+
+        view = memoryview(buffer)
+        for start in range(0, len(view), PULL_CHUNK_SIZE):
+            chunk = view[start : start + PULL_CHUNK_SIZE]
+            while chunk:
+                if self._parser is None:
+                    # a declaration must start the document, skip whitespace
+                    # left after the previous one
+                    data = bytes(chunk)
+                    chunk = chunk[len(data) - len(data.lstrip()) :]
+                    if not chunk:
+                        break
+                    self._start_document()
+                end = self._document_end(chunk)
+                self._parser.feed(chunk[:end])
+                yield from self._read_events()
+                chunk = chunk[end:]
+
+    def _document_end(self, chunk: memoryview):
+        # expat reports where the root element ended, the pull parser is only
+        # fed up to there and the rest starts the next document
+        try:
+            self._scanner.Parse(chunk, False)
+        except expat.ExpatError:
+            # junk after the root is the next document, anything else is left
+            # to the pull parser to report
+            pass
+        end = len(chunk)
+        if not self._root_end is None:
+            end = self._root_end - self._scanned
+            if end < 0 or bytes(chunk[end : end + 2]) == b"</":
+                end = bytes(chunk).index(b">", max(end, 0)) + 1
+            # else an empty root element, expat reports the index past "/>"
+        self._scanned += len(chunk)
+        return end
+
+    def _scan_start(self, *_):
+        self._depth += 1
+
+    def _scan_end(self, _):
+        self._depth -= 1
+        if not self._depth and self._root_end is None:
+            self._root_end = self._scanner.CurrentByteIndex
+
+    def close(self) -> Iterator[T]:
+        """ flush parser and yield any remaining entries """
+
+        if self._parser is None:
+            return
+        self._parser.close()
+        yield from self._read_events()
+        self._end_document()
+
+    def _start_document(self):
+        self._parser = etree.XMLPullParser(events=("start", "end"))
+        self._scanner = expat.ParserCreate()
+        self._scanner.ordered_attributes = True
+        self._scanner.StartElementHandler = self._scan_start
+        self._scanner.EndElementHandler = self._scan_end
+        self._scanned = 0
+        self._depth = 0
+        self._root_end = None
+
+    def _end_document(self):
+        self._parser = None
+        self._scanner = None
+        self._stack.clear()
+
+    def _read_events(self) -> Iterator[T]:
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                continue
+
+            self._stack.pop()
+            if elem.tag == self._tag:
+                entry = cast(T, _from_xml(elem, self._type))
+                if self._stack:
+                    self._stack[-1].remove(elem)
+                yield entry
+            if not self._stack:
+                # root closed, the rest starts a new document
+                self._end_document()
+                return
+
+
+def iterparse(
+    buffers: Iterable[BufferTypes], type_: Type[T], tag: Optional[str] = None
+) -> Iterator[T]:
+    """ Parse typed entries incrementally from buffers """
+
+    parser = PullParser(type_, tag)
+    for buffer in buffers:
+        yield from parser.feed(buffer)
+    yield from parser.close()
+
+
 def _to_xml(self: etree.Element, value, type_: Optional[type] = None):
     if type_ is None:
         type_ = type(value)
@@ -286,8 +548,10 @@ def _to_xml(self: etree.Element, value, type_: Optional[type] = None):
             and field.name in elems  # pylint: disable=unsupported-membership-test
             else field.name,
         )
-        if field.type in TO_STR:
-            child.text = str(attr_value)
+        if _is_text(field.type):
+            child.text = str(
+                attr_value.value if isinstance(attr_value, Enum) else attr_value
+            )
             continue
 
         _to_xml(child, attr_value, field.type)
@@ -325,6 +589,8 @@ def _skip(itr: Iterable[T], length: int):
 def crypto(buffer: BufferTypes, enc_offset: int = 0):
     """ Encrypt/Decrypt """
 
+    skip = max(enc_offset - 1, 0) % len(XML_KEY) + 1
+    offset_key = enc_offset & 0xFF
     return bytes(
-        k ^ b ^ enc_offset for k, b in zip(_skip(_cycle(XML_KEY), enc_offset), buffer)
+        k ^ b ^ offset_key for k, b in zip(_skip(_cycle(XML_KEY), skip), buffer)
     )
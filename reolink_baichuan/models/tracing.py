@@ -0,0 +1,75 @@
+""" Tracing Hooks """
+
+from typing import Any, Optional
+
+SPAN_ENCODE = "baichuan.encode"
+SPAN_ENCRYPT = "baichuan.encrypt"
+SPAN_DRAIN = "baichuan.drain"
+SPAN_READ = "baichuan.read"
+SPAN_DECRYPT = "baichuan.decrypt"
+SPAN_PARSE = "baichuan.parse"
+
+
+class Tracer:
+    """
+    Tracing hook interface
+
+    start is called when an operation begins and returns a token that is
+    passed back to end. Spans cover Message.tobytes (encode), xml crypto
+    (encrypt, decrypt), writer drain, Message.async_read (read, from the
+    arrival of the header) and xml parsing. Spans of operations that raise
+    are ended too, without a size.
+    """
+
+    def start(
+        self, name: str, msg_id: Optional[int] = None, size: Optional[int] = None
+    ) -> Any:
+        """ span started, returns a token for end """
+        return None
+
+    def end(self, token: Any, size: Optional[int] = None):
+        """ span ended, size is the byte count when known """
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    Adapter for an OpenTelemetry style tracer
+
+    Works with any object providing start_span(name, attributes=...) whose
+    spans provide set_attribute and end, such as
+    opentelemetry.trace.get_tracer(__name__). Nothing is imported here.
+    """
+
+    def __init__(self, tracer: Any):
+        self._tracer = tracer
+
+    def start(
+        self, name: str, msg_id: Optional[int] = None, size: Optional[int] = None
+    ):
+        attributes = {}
+        if not msg_id is None:
+            attributes["baichuan.msg_id"] = msg_id
+        if not size is None:
+            attributes["baichuan.bytes"] = size
+        return self._tracer.start_span(name, attributes=attributes)
+
+    def end(self, token: Any, size: Optional[int] = None):
+        if not size is None:
+            token.set_attribute("baichuan.bytes", size)
+        token.end()
+
+
+# None keeps every instrumented path down to one global lookup and compare
+TRACER: Optional[Tracer] = None
+
+
+def set_tracer(tracer: Optional[Tracer]):
+    """ install tracing hooks, None disables tracing """
+
+    global TRACER  # pylint: disable=global-statement
+    TRACER = tracer
+
+
+def get_tracer():
+    """ installed tracing hooks, if any """
+    return TRACER
@@ -0,0 +1,236 @@
+"""
+Change Detection Poller
+"""
+
+import asyncio
+import hashlib
+import heapq
+import inspect
+import logging
+import re
+
+from dataclasses import fields, is_dataclass
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Tuple,
+)
+
+from .bulk import Changes
+from .client import Client
+from .const import DEFAULT_POLL_CONCURRENCY, DEFAULT_POLL_INTERVAL
+
+from . import models
+
+_LOGGER = logging.getLogger(__name__)
+
+DIGEST_SIZE = 16
+
+
+class Query(NamedTuple):
+    """
+    Polled request, ignore lists dotted fields that are not changes
+
+    Ignored fields are stripped from the reply before hashing by element
+    tag, the last part of the name, so they must not be renamed in xml.
+    """
+
+    name: str
+    message: Callable[[], models.Message]
+    ignore: Tuple[str, ...] = ()
+
+
+# the reply carries the camera clock, which differs on every poll
+GENERAL = Query(
+    "general",
+    models.Message.general,
+    tuple(
+        "system_general." + name
+        for name in getattr(models.SystemGeneral, "_volatile", ())
+    ),
+)
+VERSION = Query("version", models.Message.version)
+
+
+class Change(NamedTuple):
+    """ Detected device state change """
+
+    client: Client
+    query: str
+    changes: Changes
+    body: models.XmlBody
+
+
+def field_changes(
+    old: Any, new: Any, prefix: str = "", ignore: Iterable[str] = ()
+) -> Changes:
+    """
+    field level differences between two xml dataclasses
+
+    Nested dataclasses are compared field by field and reported with
+    dotted names, e.g. "system_general.timezone". Names in ignore are
+    skipped.
+    """
+
+    ignore = frozenset(ignore)
+    result: Changes = {}
+    for field in fields(new):
+        name = prefix + field.name
+        if name in ignore:
+            continue
+        before = getattr(old, field.name, None)
+        after = getattr(new, field.name)
+        if is_dataclass(before) and type(before) is type(after):
+            result.update(field_changes(before, after, name + ".", ignore))
+        elif before != after:
+            result[name] = (before, after)
+    return result
+
+
+@lru_cache(maxsize=None)
+def _stripper(ignore: Tuple[str, ...]) -> Pattern:
+    tags = b"|".join(re.escape(name.rpartition(".")[2].encode()) for name in ignore)
+    return re.compile(b"<(" + tags + rb")>[^<]*</\1>|<(?:" + tags + rb")\s*/>")
+
+
+class _Target:
+    __slots__ = ("client", "interval", "digests", "bodies", "busy")
+
+    def __init__(self, client: Client, interval: float):
+        self.client = client
+        self.interval = interval
+        self.digests: Dict[str, bytes] = {}
+        self.bodies: Dict[str, models.XmlBody] = {}
+        self.busy = False
+
+
+class Poller:
+    """
+    Polls cameras and reports only what changed
+
+    Each camera is polled every interval seconds (or its own entry in
+    intervals, by host), with the first polls spread evenly over the
+    interval so a fleet does not poll in bursts. Replies are hashed before
+    parsing, an unchanged reply is not parsed or compared. The first reply
+    of each query is the baseline and is not reported. Ignored elements
+    (the camera clock of GENERAL) are stripped before hashing.
+    """
+
+    def __init__(
+        self,
+        clients: Iterable[Client],
+        queries: Iterable[Query] = (GENERAL, VERSION),
+        interval: float = DEFAULT_POLL_INTERVAL,
+        intervals: Optional[Dict[str, float]] = None,
+        concurrency: int = DEFAULT_POLL_CONCURRENCY,
+    ):
+        intervals = intervals or {}
+        self.queries = tuple(queries)
+        self._targets = [
+            _Target(client, intervals.get(client.host, interval)) for client in clients
+        ]
+        self._concurrency = concurrency
+
+    def state(self, client: Client) -> Dict[str, models.XmlBody]:
+        """ last known bodies of a camera by query name """
+
+        for target in self._targets:
+            if target.client is client:
+                return dict(target.bodies)
+        return {}
+
+    async def _poll(self, target: _Target) -> List[Change]:
+
+        found: List[Change] = []
+        for query in self.queries:
+            try:
+                reply = await target.client.request(query.message(), parse=False)
+            except (OSError, asyncio.IncompleteReadError) as err:
+                _LOGGER.debug("Poll of %s failed: %s", target.client.host, err)
+                return found
+            if reply is None:
+                continue
+
+            raw = reply.body.raw if not reply.body.raw is None else b""
+            if query.ignore:
+                raw = _stripper(query.ignore).sub(b"", raw)
+            digest = hashlib.blake2b(raw, digest_size=DIGEST_SIZE).digest()
+            if target.digests.get(query.name) == digest:
+                continue
+            target.digests[query.name] = digest
+
+            body = reply.parse().body.xml
+            old = target.bodies.get(query.name)
+            target.bodies[query.name] = body
+            if old is None or body is None:
+                continue
+            delta = field_changes(old, body, ignore=query.ignore)
+            if delta:
+                found.append(Change(target.client, query.name, delta, body))
+        return found
+
+    async def changes(self) -> AsyncIterator[Change]:
+        """ poll until the iteration is stopped, yielding changes """
+
+        loop = asyncio.get_running_loop()
+        found: "asyncio.Queue[Change]" = asyncio.Queue()
+        slots = asyncio.Semaphore(self._concurrency)
+        tasks = set()
+
+        async def _run(target: _Target):
+            try:
+                async with slots:
+                    for change in await self._poll(target):
+                        found.put_nowait(change)
+            finally:
+                target.busy = False
+
+        async def _schedule():
+            count = max(len(self._targets), 1)
+            start = loop.time()
+            heap: List[Tuple[float, int]] = [
+                (start + target.interval * idx / count, idx)
+                for idx, target in enumerate(self._targets)
+            ]
+            heapq.heapify(heap)
+            while heap:
+                (due, idx) = heap[0]
+                now = loop.time()
+                if due > now:
+                    await asyncio.sleep(due - now)
+                    continue
+                target = self._targets[idx]
+                heapq.heapreplace(heap, (max(due + target.interval, now), idx))
+                if target.busy:
+                    _LOGGER.debug("Poll of %s still running", target.client.host)
+                    continue
+                target.busy = True
+                task = asyncio.ensure_future(_run(target))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        scheduler = asyncio.ensure_future(_schedule())
+        try:
+            while True:
+                yield await found.get()
+        finally:
+            scheduler.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    async def run(self, on_change: Callable[[Change], Optional[Awaitable[None]]]):
+        """ poll until cancelled, calling on_change for every change """
+
+        async for change in self.changes():
+            result = on_change(change)
+            if inspect.isawaitable(result):
+                await result
@@ -0,0 +1,176 @@
+"""
+Pre-event Ring Buffer
+"""
+
+import asyncio
+import logging
+
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional
+
+from .const import (
+    DEFAULT_PRE_EVENT_BYTES,
+    DEFAULT_PRE_EVENT_SECONDS,
+    DEFAULT_STREAM_QUEUE,
+)
+from .models.media import US_PER_SECOND, Frame, MediaClock
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _Gop:
+    """ Group of pictures, keyframe first """
+
+    __slots__ = ("start", "end", "size", "frames", "base")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.end = start
+        self.size = 0
+        self.frames: List[Frame] = []
+        self.base = None
+
+
+class _Listener:
+    __slots__ = ("queue", "overrun")
+
+    def __init__(self, maxsize: int):
+        self.queue: "asyncio.Queue[Optional[Frame]]" = asyncio.Queue(maxsize)
+        self.overrun = False
+
+
+class PreEventBuffer:
+    """
+    Fixed capacity frame buffer for event clips
+
+    Holds at most max_bytes and max_seconds of media time, rounded up to a
+    whole GOP. Whole GOPs are evicted, so the buffer always starts at a
+    keyframe. Frames are kept as the views produced by the demuxer, nothing
+    is copied. A view keeps its whole message buffer alive, so max_bytes
+    counts the buffers the frames point into rather than their payloads.
+    """
+
+    def __init__(
+        self,
+        max_seconds: float = DEFAULT_PRE_EVENT_SECONDS,
+        max_bytes: int = DEFAULT_PRE_EVENT_BYTES,
+    ):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self._gops: Deque[_Gop] = deque()
+        self._size = 0
+        self._clock = MediaClock()
+        self._listeners: List[_Listener] = []
+
+    @property
+    def size(self):
+        """ buffered bytes, counting the buffers the frames point into """
+        return self._size
+
+    @property
+    def duration(self):
+        """ buffered media time in seconds """
+        if not self._gops:
+            return 0.0
+        return (self._gops[-1].end - self._gops[0].start) / US_PER_SECOND
+
+    def push(self, frame: Frame):
+        """ add a frame, evicting the oldest GOPs when over capacity """
+
+        timestamp = self._clock.update(frame)
+        for listener in self._listeners:
+            if listener.overrun:
+                continue
+            if listener.queue.full():
+                _LOGGER.warning("Pre-event clip consumer too slow, ending clip")
+                listener.overrun = True
+                continue
+            listener.queue.put_nowait(frame)
+
+        if frame.keyframe:
+            self._gops.append(_Gop(timestamp))
+        elif not self._gops:
+            # nothing to decode from until the first keyframe
+            return
+
+        gop = self._gops[-1]
+        # frames of one message arrive together, its buffer is counted once
+        # per GOP that holds a view into it
+        base = getattr(frame.payload, "obj", frame.payload)
+        size = 0
+        if not base is gop.base:
+            gop.base = base
+            size = memoryview(base).nbytes
+        gop.frames.append(frame)
+        gop.end = timestamp
+        gop.size += size
+        self._size += size
+
+        limit = self.max_seconds * US_PER_SECOND
+        while len(self._gops) > 1 and (
+            self._size > self.max_bytes or timestamp - self._gops[1].start >= limit
+        ):
+            self._size -= self._gops.popleft().size
+        if self._size > self.max_bytes:
+            # a single GOP larger than the buffer cannot be kept
+            self._gops.clear()
+            self._size = 0
+
+    def snapshot(self, seconds: Optional[float] = None) -> List[Frame]:
+        """
+        frames covering at least the last seconds (all when None)
+
+        Starts at the newest keyframe at or before the requested point, the
+        returned frames share their payloads with the buffer.
+        """
+
+        if not self._gops:
+            return []
+        gops = list(self._gops)
+        first = 0
+        if not seconds is None:
+            since = gops[-1].end - seconds * US_PER_SECOND
+            for idx, gop in enumerate(gops):
+                if gop.start <= since:
+                    first = idx
+        return [frame for gop in gops[first:] for frame in gop.frames]
+
+    async def clip(
+        self, seconds: Optional[float] = None, maxsize: int = DEFAULT_STREAM_QUEUE
+    ) -> AsyncIterator[Frame]:
+        """
+        yield the snapshot then every frame pushed afterwards
+
+        The snapshot is taken when iteration starts, so the live frames
+        continue it without gaps or repeats. A consumer that falls maxsize
+        frames behind has its clip ended, every clip ends with end().
+        """
+
+        listener = _Listener(maxsize)
+        frames = self.snapshot(seconds)
+        self._listeners.append(listener)
+        try:
+            for frame in frames:
+                yield frame
+            while not listener.overrun or not listener.queue.empty():
+                frame = await listener.queue.get()
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self._listeners.remove(listener)
+
+    def end(self):
+        """ source stream ended, clips end after the frames already queued """
+
+        for listener in self._listeners:
+            if listener.queue.full():
+                listener.overrun = True
+            else:
+                listener.queue.put_nowait(None)
+
+    def clear(self):
+        """ drop all buffered frames """
+
+        self._gops.clear()
+        self._size = 0
@@ -0,0 +1,94 @@
+"""
+Round Trip Estimation
+"""
+
+from typing import Dict, Optional
+
+from .const import (
+    DEFAULT_INITIAL_TIMEOUT,
+    DEFAULT_MIN_TIMEOUT,
+    DEFAULT_TIMEOUT,
+    TIMEOUT_FLOORS,
+)
+
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+GRANULARITY = 0.01
+
+
+class _Estimate:
+    __slots__ = ("srtt", "rttvar", "rto")
+
+    def __init__(self, rto: float):
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.rto = rto
+
+    def sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.rto = self.srtt + max(GRANULARITY, K * self.rttvar)
+
+
+class RttEstimator:
+    """
+    Smoothed round trip estimator (TCP style SRTT/RTTVAR, RFC 6298)
+
+    Derives request timeouts from observed replies, bounded by minimum and
+    maximum. Each message id keeps its own estimate, so fast pings do not
+    shorten the timeout of slower commands, and ids not seen yet start from
+    initial. The estimate without an id follows the samples of every id
+    without a floor. Message ids in floors (slow commands such as login)
+    never time out sooner than their floor.
+    """
+
+    def __init__(
+        self,
+        initial: float = DEFAULT_INITIAL_TIMEOUT,
+        minimum: float = DEFAULT_MIN_TIMEOUT,
+        maximum: float = DEFAULT_TIMEOUT,
+        floors: Optional[Dict[int, float]] = None,
+    ):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.floors = floors if not floors is None else TIMEOUT_FLOORS
+        self._estimates: Dict[Optional[int], _Estimate] = {}
+
+    def _clamp(self, value: float):
+        return min(max(value, self.minimum), self.maximum)
+
+    def _estimate(self, msg_id: Optional[int]):
+        estimate = self._estimates.get(msg_id)
+        if estimate is None:
+            estimate = self._estimates[msg_id] = _Estimate(self.initial)
+        return estimate
+
+    @property
+    def srtt(self) -> Optional[float]:
+        """ smoothed round trip over all samples, if any """
+        return self._estimate(None).srtt
+
+    def sample(self, rtt: float, msg_id: Optional[int] = None):
+        """ update the estimate from a measured round trip """
+
+        self._estimate(msg_id).sample(rtt)
+        if not msg_id is None and not msg_id in self.floors:
+            self._estimate(None).sample(rtt)
+
+    def backoff(self, msg_id: Optional[int] = None):
+        """ double the timeout after a loss """
+
+        estimate = self._estimate(msg_id)
+        estimate.rto = self._clamp(estimate.rto) * 2
+
+    def timeout(self, msg_id: Optional[int] = None):
+        """ timeout for a request """
+
+        rto = self._clamp(self._estimate(msg_id).rto)
+        return max(rto, self.floors.get(msg_id, 0))
@@ -0,0 +1,172 @@
+"""
+Stream Statistics
+"""
+
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+
+from .const import DEFAULT_STATS_WINDOW
+from .models.media import US_PER_SECOND, US_WRAP, MediaKind, MediaScanner
+from .models.typings import BufferTypes
+
+
+JITTER_GAIN = 1 / 16
+INTERVAL_GAIN = 1 / 8
+GAP_FACTOR = 2
+
+
+class StreamHealth(NamedTuple):
+    """ Stream Statistics Snapshot """
+
+    channel_id: int
+    stream: int
+    fps: float
+    bitrate: float
+    jitter: float
+    gaps: int
+    max_gap: float
+    keyframe_interval: Optional[float]
+    frames: int
+    bytes: int
+    dropped: int
+
+
+class _Bucket:
+    __slots__ = ("second", "frames", "bytes")
+
+    def __init__(self, second: int):
+        self.second = second
+        self.frames = 0
+        self.bytes = 0
+
+
+class StreamStats:
+    """
+    Rolling statistics of a live stream
+
+    Fed with every routed binary payload and its arrival time. Only frame
+    headers are read (MediaScanner), so the cost is per frame, not per byte.
+
+    - fps and bitrate over the last window seconds of arrivals
+    - jitter, the smoothed difference between arrival and media time spacing
+      of video frames (RFC 3550 interarrival jitter), in seconds
+    - gaps, video frames further than GAP_FACTOR smoothed frame intervals of
+      media time after the previous one, and the largest such gap
+    - keyframe_interval, smoothed media time between keyframes
+    """
+
+    def __init__(self, window: float = DEFAULT_STATS_WINDOW):
+        self.window = window
+        self.frames = 0
+        self.bytes = 0
+        self.jitter = 0.0
+        self.gaps = 0
+        self.max_gap = 0.0
+        self.keyframe_interval: Optional[float] = None
+        self._scanner = MediaScanner()
+        self._buckets: Deque[_Bucket] = deque()
+        self._started: Optional[float] = None
+        self._last: Optional[int] = None
+        self._media = 0
+        self._arrival = 0.0
+        self._interval: Optional[float] = None
+        self._keyframe: Optional[int] = None
+
+    def _bucket(self, now: float):
+        second = int(now)
+        if not self._buckets or self._buckets[-1].second != second:
+            self._buckets.append(_Bucket(second))
+            while second - self._buckets[0].second >= self.window:
+                self._buckets.popleft()
+        return self._buckets[-1]
+
+    def update(self, binary: BufferTypes, now: float):
+        """ account a binary payload that arrived at now (loop time) """
+
+        if self._started is None:
+            self._started = now
+        size = len(binary)
+        self.bytes += size
+        bucket = self._bucket(now)
+        bucket.bytes += size
+
+        for header in self._scanner.feed(binary):
+            if not header.kind in (MediaKind.IFRAME, MediaKind.PFRAME):
+                continue
+            self.frames += 1
+            bucket.frames += 1
+            self._on_video(header.microseconds, now)
+            if header.kind == MediaKind.IFRAME:
+                self._on_keyframe()
+
+    def _on_video(self, microseconds: int, now: float):
+        if self._last is None:
+            self._last = microseconds
+            self._arrival = now
+            return
+        delta = ((microseconds - self._last) % US_WRAP) / US_PER_SECOND
+        self._last = microseconds
+        self._media += int(delta * US_PER_SECOND)
+
+        transit = (now - self._arrival) - delta
+        self._arrival = now
+        self.jitter += (abs(transit) - self.jitter) * JITTER_GAIN
+
+        if not self._interval is None and delta > GAP_FACTOR * self._interval:
+            self.gaps += 1
+            self.max_gap = max(self.max_gap, delta)
+        elif delta > 0:
+            if self._interval is None:
+                self._interval = delta
+            else:
+                self._interval += (delta - self._interval) * INTERVAL_GAIN
+
+    def _on_keyframe(self):
+        media = self._media
+        if not self._keyframe is None:
+            interval = (media - self._keyframe) / US_PER_SECOND
+            if self.keyframe_interval is None:
+                self.keyframe_interval = interval
+            else:
+                self.keyframe_interval += (
+                    interval - self.keyframe_interval
+                ) * INTERVAL_GAIN
+        self._keyframe = media
+
+    def rates(self, now: float):
+        """ (frames per second, bits per second) over the window """
+
+        if not self._buckets or self._started is None:
+            return (0.0, 0.0)
+        first = max(self._buckets[0].second, int(now) - self.window + 1)
+        span = min(now - max(first, self._started), self.window)
+        if span <= 0:
+            return (0.0, 0.0)
+        frames = 0
+        size = 0
+        for bucket in self._buckets:
+            if bucket.second >= first:
+                frames += bucket.frames
+                size += bucket.bytes
+        return (frames / span, size * 8 / span)
+
+    def snapshot(
+        self, channel_id: int, stream: int, dropped: int, now: float
+    ) -> StreamHealth:
+        """ current statistics """
+
+        (fps, bitrate) = self.rates(now)
+        return StreamHealth(
+            channel_id,
+            stream,
+            fps,
+            bitrate,
+            self.jitter,
+            self.gaps,
+            self.max_gap,
+            self.keyframe_interval,
+            self.frames,
+            self.bytes,
+            dropped,
+        )
+
@@ -0,0 +1,200 @@
+"""
+Demultiplexed Streams
+"""
+
+import asyncio
+import logging
+
+from typing import AsyncIterator, Awaitable, Callable, Optional, Union
+
+from .const import DEFAULT_STREAM_QUEUE, DEFAULT_STREAM_STALL
+from .stats import StreamHealth, StreamStats
+
+from . import models
+from .models.media import (
+    KEYFRAMES,
+    US_PER_SECOND,
+    Frame,
+    MediaClock,
+    MediaKind,
+    MediaReader,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Stream:
+    """
+    Per ClientIndex message consumer
+
+    Messages routed to the stream are queued up to maxsize. When full, a
+    dropping stream discards the oldest message (live preview), otherwise the
+    connection reader waits for the consumer (downloads), for at most stall
+    seconds before the stream is ended so other requests on the connection
+    are not held up.
+
+    A keyframes_only stream demuxes as messages are routed and queues only
+    keyframe (and info) frames, P-frames and audio are skipped from their
+    media header without being copied or queued.
+
+    With stats, routed payloads are accounted in a StreamStats as they
+    arrive, before any queueing or dropping.
+    """
+
+    def __init__(
+        self,
+        client_idx: models.ClientIndex,
+        maxsize: int = DEFAULT_STREAM_QUEUE,
+        drop: bool = True,
+        on_close: Optional[Callable[["Stream"], Awaitable[None]]] = None,
+        keyframes_only: bool = False,
+        stats: bool = False,
+        stall: float = DEFAULT_STREAM_STALL,
+    ):
+        self.client_idx = client_idx
+        self.dropped = 0
+        self.stats = StreamStats() if stats else None
+        self._queue: "asyncio.Queue[Optional[Union[models.Message, Frame]]]" = (
+            asyncio.Queue(maxsize)
+        )
+        self._drop = drop
+        self._stall = stall
+        self._room: Optional[asyncio.Future] = None
+        self._reader = MediaReader(KEYFRAMES) if keyframes_only else None
+        self._ended = False
+        self._on_close = on_close
+
+    @property
+    def key(self):
+        """ routing key """
+        return self.client_idx.__to_int__()
+
+    @property
+    def ended(self):
+        """ Return True once no more messages will arrive """
+        return self._ended
+
+    async def put(self, message: models.Message):
+        """ queue a routed message """
+
+        if self._ended:
+            return
+        binary = getattr(message.body, "binary", None)
+        if not self.stats is None and not binary is None:
+            self.stats.update(binary, asyncio.get_running_loop().time())
+        if self._reader is None:
+            await self._put(message)
+            return
+        if binary is None:
+            return
+        for frame in self._reader.feed(binary):
+            await self._put(frame)
+
+    async def _put(self, item: Union[models.Message, Frame]):
+        if self._ended:
+            return
+        if not self._drop:
+            while self._queue.full():
+                self._room = asyncio.get_running_loop().create_future()
+                try:
+                    await asyncio.wait_for(self._room, self._stall)
+                except asyncio.TimeoutError:
+                    _LOGGER.warning("Stream consumer stalled, ending stream")
+                    self.end()
+                finally:
+                    self._room = None
+                if self._ended:
+                    return
+            self._queue.put_nowait(item)
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def health(self) -> Optional[StreamHealth]:
+        """ statistics snapshot, None without stats """
+
+        if self.stats is None:
+            return None
+        return self.stats.snapshot(
+            self.client_idx.channel_id,
+            self.client_idx.stream,
+            self.dropped,
+            asyncio.get_running_loop().time(),
+        )
+
+    def end(self):
+        """ mark stream finished, waking the consumer and the connection reader """
+
+        if self._ended:
+            return
+        self._ended = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+        self._wake()
+
+    def _wake(self):
+        if not self._room is None and not self._room.done():
+            self._room.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def read(self):
+        """ next message (frame when keyframes_only), None once ended """
+
+        if self._ended and self._queue.empty():
+            return None
+        item = await self._queue.get()
+        self._wake()
+        return item
+
+    async def __anext__(self):
+        message = await self.read()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def frames(self, interval: Optional[float] = None) -> AsyncIterator[Frame]:
+        """
+        demux media frames from the routed binary payloads
+
+        With interval, only keyframes at least interval seconds of media time
+        apart are yielded (info frames always pass), P-frames are skipped
+        before their payload is touched.
+        """
+
+        reader = None
+        if self._reader is None:
+            reader = MediaReader(None if interval is None else KEYFRAMES)
+        clock = MediaClock()
+        due = 0
+        async for item in self:
+            if reader is None:
+                frames = (item,)
+            else:
+                binary = getattr(item.body, "binary", None)
+                if binary is None:
+                    continue
+                frames = reader.feed(binary)
+
+            for frame in frames:
+                if not interval is None and frame.kind != MediaKind.INFO:
+                    if not frame.keyframe:
+                        continue
+                    now = clock.update(frame)
+                    if now < due:
+                        continue
+                    due = now + interval * US_PER_SECOND
+                yield frame
+
+    async def close(self):
+        """ Stop the stream """
+
+        if self._on_close is not None:
+            on_close = self._on_close
+            self._on_close = None
+            await on_close(self)
+        self.end()
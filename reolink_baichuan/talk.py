@@ -0,0 +1,116 @@
+"""
+Talkback Audio
+"""
+
+import asyncio
+
+from typing import AsyncIterable, Awaitable, Callable, Optional
+
+from .const import DEFAULT_TALK_LEAD
+
+from . import models
+from .models.media import audio_header
+from .models.typings import BufferTypes
+
+AAC_FRAME_SAMPLES = 1024
+
+_KINDS = {
+    "adpcm": models.MediaKind.ADPCM,
+    "aac": models.MediaKind.AAC,
+}
+
+
+class Talk:
+    """
+    Paced talkback audio sink
+
+    Frames are sent when their audio time comes due, at most lead seconds
+    ahead, so the camera side buffer stays short and steady. A producer
+    that falls behind restarts the clock instead of bursting to catch up.
+
+    Each frame goes out as the packed header, media framing and the
+    caller's payload buffer, the payload is not copied. Writes wait for the
+    socket when it backs up instead of buffering without limit.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[models.Message], Awaitable[bool]],
+        channel_id: int,
+        audio_config: models.AudioConfig,
+        lead: float = DEFAULT_TALK_LEAD,
+        on_close: Optional[Callable[["Talk"], Awaitable[None]]] = None,
+    ):
+        kind = _KINDS.get(audio_config.audio_type.lower())
+        if kind is None:
+            raise ValueError(f"Unsupported talk audio: {audio_config.audio_type}")
+        self.channel_id = channel_id
+        self.audio_config = audio_config
+        self.lead = lead
+        self._kind = kind
+        self._send = send
+        self._on_close = on_close
+        self._due: Optional[float] = None
+        self._closed = False
+
+    @property
+    def closed(self):
+        """ Return True once closed """
+        return self._closed
+
+    def duration(self, payload: BufferTypes):
+        """ audio time of a frame in seconds """
+
+        if self._kind == models.MediaKind.ADPCM:
+            # DVI4 block: 4 byte state header (one sample), two samples a byte
+            samples = (len(payload) - 4) * 2 + 1
+        else:
+            samples = AAC_FRAME_SAMPLES
+        return samples / self.audio_config.sample_rate
+
+    async def write(self, payload: BufferTypes, duration: Optional[float] = None):
+        """ send an encoded audio frame once due, False when not sent """
+
+        if self._closed:
+            return False
+        if duration is None:
+            duration = self.duration(payload)
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._due is None or self._due < now:
+            self._due = now
+        wait = self._due - now - self.lead
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        (header, padding) = audio_header(self._kind, len(payload))
+        message = models.Message.talk(self.channel_id, (header, payload, padding))
+        if not await self._send(message):
+            return False
+        self._due += duration
+        return True
+
+    async def feed(self, frames: AsyncIterable[BufferTypes]):
+        """ write frames until the iterable ends """
+
+        async for payload in frames:
+            if not await self.write(payload):
+                break
+
+    async def close(self):
+        """ Stop talking """
+
+        if self._closed:
+            return
+        self._closed = True
+        if self._on_close is not None:
+            on_close = self._on_close
+            self._on_close = None
+            await on_close(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
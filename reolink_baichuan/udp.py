@@ -0,0 +1,371 @@
+"""
+UDP Transport
+"""
+
+import asyncio
+import logging
+import random
+import struct
+
+from typing import Dict, List, Optional, Tuple
+
+from .const import DEFAULT_UDP_MTU, DEFAULT_UDP_RETRIES, DEFAULT_UDP_WINDOW
+from .rtt import RttEstimator
+
+_LOGGER = logging.getLogger(__name__)
+
+UDP_MAGIC_DATA = 0x2A87CF10
+UDP_MAGIC_ACK = 0x2A87CF20
+
+MAGIC_STRUCT = "<I"
+MAGIC_STRUCT_SIZE = struct.calcsize(MAGIC_STRUCT)
+
+# magic, connection id, unknown, packet id, payload length
+DATA_STRUCT = "<IiIII"
+DATA_STRUCT_SIZE = struct.calcsize(DATA_STRUCT)
+
+# magic, connection id, unknown, unknown, packet id, unknown, payload length
+ACK_STRUCT = "<IiIIIII"
+ACK_STRUCT_SIZE = struct.calcsize(ACK_STRUCT)
+
+ACK_DELAY = 0.005
+RETRANSMIT_INITIAL = 0.5
+RETRANSMIT_MIN = 0.05
+RETRANSMIT_MAX = 1
+
+PACKET_MASK = 0xFFFFFFFF
+
+
+def retransmit_budget(retries: int = DEFAULT_UDP_RETRIES):
+    """ longest a packet is retransmitted for before the peer is taken as gone """
+    return (retries + 1) * RETRANSMIT_MAX
+
+
+class _Packet:
+    __slots__ = ("data", "sent", "resent")
+
+    def __init__(self, data: bytes, sent: float):
+        self.data = data
+        self.sent = sent
+        self.resent = False
+
+
+class UdpProtocol(asyncio.DatagramProtocol):
+    """
+    Baichuan UDP framing
+
+    Splits the message byte stream into numbered data packets, retransmits
+    until acknowledged and reorders received packets before feeding them to
+    reader, so the Message layer sees the same byte stream as over TCP. Acks
+    carry a bitmap of packets received past the first gap, which lets the
+    sender repair a loss within a round trip instead of waiting a timeout.
+
+    Retransmission timeouts back off, after retries of them in a row with
+    nothing heard from the peer it is taken as gone. The connection is then
+    closed with ConnectionResetError, which fails the reader and drain()
+    instead of leaving them waiting.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        connection_id: int,
+        mtu: int = DEFAULT_UDP_MTU,
+        window: int = DEFAULT_UDP_WINDOW,
+        peer: Optional[Tuple[str, int]] = None,
+        retries: int = DEFAULT_UDP_RETRIES,
+    ):
+        self.reader = reader
+        self.connection_id = connection_id
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._mtu = mtu
+        self._window = window
+        self._peer = peer
+        self._retries = retries
+        self._silent = 0
+        self._error: Optional[Exception] = None
+        self._loop = asyncio.get_event_loop()
+        self._rtt = RttEstimator(
+            RETRANSMIT_INITIAL, RETRANSMIT_MIN, RETRANSMIT_MAX, floors={}
+        )
+        self._next_id = 0
+        self._unacked: Dict[int, _Packet] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._expected = 0
+        self._reorder: Dict[int, bytes] = {}
+        self._ack: Optional[asyncio.TimerHandle] = None
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._closed = self._loop.create_future()
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def connection_lost(self, exc: Optional[Exception]):
+        for handle in (self._timer, self._ack):
+            if not handle is None:
+                handle.cancel()
+        exc = exc or self._error
+        if exc is None:
+            self.reader.feed_eof()
+        else:
+            self.reader.set_exception(exc)
+        self._writable.set()
+        if not self._closed.done():
+            self._closed.set_result(None)
+
+    def error_received(self, exc: Exception):
+        _LOGGER.debug("UDP error from %s: %s", self._peer, exc)
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        if len(data) < MAGIC_STRUCT_SIZE:
+            return
+        (magic,) = struct.unpack_from(MAGIC_STRUCT, data)
+        if magic == UDP_MAGIC_DATA and len(data) >= DATA_STRUCT_SIZE:
+            (_, connection_id, _, packet_id, length) = struct.unpack_from(
+                DATA_STRUCT, data
+            )
+            if connection_id != self.connection_id:
+                return
+            self._silent = 0
+            if self._peer is None:
+                self._peer = addr
+            payload = memoryview(data)[DATA_STRUCT_SIZE : DATA_STRUCT_SIZE + length]
+            self._on_data(packet_id, payload)
+        elif magic == UDP_MAGIC_ACK and len(data) >= ACK_STRUCT_SIZE:
+            (_, connection_id, _, _, packet_id, _, length) = struct.unpack_from(
+                ACK_STRUCT, data
+            )
+            if connection_id != self.connection_id:
+                return
+            self._silent = 0
+            bitmap = memoryview(data)[ACK_STRUCT_SIZE : ACK_STRUCT_SIZE + length]
+            self._on_ack(packet_id, bitmap)
+
+    def _sendto(self, data: bytes):
+        if self.transport is None or self.transport.is_closing():
+            return
+        if self._peer is None:
+            self.transport.sendto(data)
+        else:
+            self.transport.sendto(data, self._peer)
+
+    # receiving
+
+    def _on_data(self, packet_id: int, payload: memoryview):
+        ahead = (packet_id - self._expected) & PACKET_MASK
+        if ahead < self._window and not packet_id in self._reorder:
+            self._reorder[packet_id] = bytes(payload)
+            while self._expected in self._reorder:
+                self.reader.feed_data(self._reorder.pop(self._expected))
+                self._expected = (self._expected + 1) & PACKET_MASK
+        if self._ack is None:
+            self._ack = self._loop.call_later(ACK_DELAY, self._send_ack)
+
+    def _send_ack(self):
+        self._ack = None
+        bitmap = b""
+        if self._reorder:
+            span = max((pid - self._expected) & PACKET_MASK for pid in self._reorder)
+            bitmap = bytes(
+                1 if ((self._expected + i) & PACKET_MASK) in self._reorder else 0
+                for i in range(span + 1)
+            )
+        header = struct.pack(
+            ACK_STRUCT,
+            UDP_MAGIC_ACK,
+            self.connection_id,
+            0,
+            0,
+            (self._expected - 1) & PACKET_MASK,
+            0,
+            len(bitmap),
+        )
+        self._sendto(header + bitmap)
+
+    # sending
+
+    def _on_ack(self, packet_id: int, bitmap: memoryview):
+        now = self._loop.time()
+        first = (packet_id + 1) & PACKET_MASK
+        acked: List[int] = [
+            pid
+            for pid in self._unacked
+            if (first - pid - 1) & PACKET_MASK < self._window
+        ]
+        acked.extend(
+            (first + i) & PACKET_MASK for i, received in enumerate(bitmap) if received
+        )
+        for pid in acked:
+            packet = self._unacked.pop(pid, None)
+            if not packet is None and not packet.resent:
+                self._rtt.sample(now - packet.sent)
+
+        if bitmap:
+            # packets missing before a selectively acked one are lost, resend
+            # each at most once per round trip
+            limit = self._rtt.srtt or self._rtt.timeout()
+            for i, received in enumerate(bitmap):
+                packet = self._unacked.get((first + i) & PACKET_MASK)
+                if not received and not packet is None and now - packet.sent >= limit:
+                    self._resend(packet, now)
+
+        self._update_writable()
+
+    def _resend(self, packet: _Packet, now: float):
+        packet.sent = now
+        packet.resent = True
+        self._sendto(packet.data)
+
+    def _abort(self, exc: Exception):
+        _LOGGER.debug("Closing UDP connection: %s", exc)
+        self._error = exc
+        self._unacked.clear()
+        if not self.transport is None:
+            self.transport.close()
+
+    def _arm(self):
+        if self._timer is None and self._unacked:
+            self._timer = self._loop.call_later(self._rtt.timeout(), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        now = self._loop.time()
+        timeout = self._rtt.timeout()
+        expired = [p for p in self._unacked.values() if now - p.sent >= timeout]
+        if expired:
+            self._silent += 1
+            if self._silent > self._retries:
+                self._abort(ConnectionResetError(f"UDP peer {self._peer} is gone"))
+                return
+            self._rtt.backoff()
+            for packet in expired:
+                self._resend(packet, now)
+        self._arm()
+
+    def _update_writable(self):
+        if len(self._unacked) < self._window:
+            self._writable.set()
+        else:
+            self._writable.clear()
+
+    def write(self, data: bytes):
+        """ send data as numbered packets """
+
+        if not self._error is None:
+            return
+        view = memoryview(data)
+        now = self._loop.time()
+        for start in range(0, len(view), self._mtu):
+            payload = view[start : start + self._mtu]
+            packet = _Packet(
+                struct.pack(
+                    DATA_STRUCT,
+                    UDP_MAGIC_DATA,
+                    self.connection_id,
+                    0,
+                    self._next_id,
+                    len(payload),
+                )
+                + payload,
+                now,
+            )
+            self._unacked[self._next_id] = packet
+            self._next_id = (self._next_id + 1) & PACKET_MASK
+            self._sendto(packet.data)
+        self._update_writable()
+        self._arm()
+
+    @property
+    def unacked(self):
+        """ packets in flight """
+        return len(self._unacked)
+
+    async def drain(self):
+        """ wait until the send window has room """
+
+        await self._writable.wait()
+        if not self._error is None:
+            raise self._error
+        if self.transport is None or self.transport.is_closing():
+            raise ConnectionResetError("UDP connection closed")
+
+    async def wait_closed(self):
+        """ wait for the transport to close """
+
+        await asyncio.shield(self._closed)
+
+
+class UdpWriter:
+    """ StreamWriter stand-in over a UdpProtocol """
+
+    def __init__(self, transport: asyncio.DatagramTransport, protocol: UdpProtocol):
+        self._transport = transport
+        self._protocol = protocol
+
+    @property
+    def transport(self):
+        """ underlying datagram transport """
+        return self._transport
+
+    @property
+    def protocol(self):
+        """ udp framing protocol """
+        return self._protocol
+
+    def write(self, data: bytes):
+        """ queue data for reliable delivery """
+        self._protocol.write(data)
+
+    def writelines(self, data):
+        """ queue several buffers for reliable delivery """
+        self._protocol.write(b"".join(data))
+
+    async def drain(self):
+        """ wait for send window room """
+        await self._protocol.drain()
+
+    def get_extra_info(self, name: str, default=None):
+        """ transport info """
+        return self._transport.get_extra_info(name, default)
+
+    def is_closing(self):
+        """ Return True if closing """
+        return self._transport.is_closing()
+
+    def close(self):
+        """ close transport """
+        self._transport.close()
+
+    async def wait_closed(self):
+        """ wait for close """
+        await self._protocol.wait_closed()
+
+
+async def open_udp_connection(
+    host: str,
+    port: int,
+    connection_id: Optional[int] = None,
+    mtu: int = DEFAULT_UDP_MTU,
+    window: int = DEFAULT_UDP_WINDOW,
+    retries: int = DEFAULT_UDP_RETRIES,
+):
+    """
+    open a Baichuan UDP connection, returns (reader, writer)
+
+    The UDP discovery handshake that cameras use to negotiate connection ids
+    is not performed, a random connection_id (or the one given) is used and
+    packets go straight to host:port. This works against peers that accept
+    any connection id, such as the loopback stand-in in tests/, cameras that
+    require the handshake will not answer.
+    """
+
+    if connection_id is None:
+        connection_id = random.randint(1, 0x7FFFFFFF)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    (transport, protocol) = await loop.create_datagram_endpoint(
+        lambda: UdpProtocol(reader, connection_id, mtu, window, retries=retries),
+        remote_addr=(host, port),
+    )
+    return (reader, UdpWriter(transport, protocol))
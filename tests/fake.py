@@ -0,0 +1,117 @@
+""" Fake camera for tests """
+
+import asyncio
+
+from typing import Dict, List, Set
+
+from reolink_baichuan import models
+from reolink_baichuan.models.const import (
+    MSG_ID_DOWNLOAD,
+    MSG_ID_DOWNLOAD_STOP,
+    MSG_ID_FILE_INFO_LIST_OPEN,
+    MSG_ID_GET_GENERAL,
+    MSG_ID_LOGIN,
+    MSG_ID_VERSION,
+)
+from reolink_baichuan.models.metadata import (
+    MSG_CLASS_LEGACY,
+    MSG_CLASS_MODERN,
+    Metadata,
+)
+from reolink_baichuan.models.modern import Modern, xml
+
+
+def reply(request: models.Message, body=None, binary=None):
+    """ encoded reply to request, echoing its ClientIndex """
+
+    meta = Metadata(
+        request.meta.msg_id,
+        request.meta.client_idx,
+        msg_class=MSG_CLASS_MODERN,
+        encrypted=True,
+    )
+    return models.Message(meta, Modern(body, binary)).tobytes()
+
+
+class FakeCamera:
+    """
+    answers logins, version, general, ping, search and download requests
+
+    Searches find nothing, downloads send a chunk of chunk_size bytes every
+    10ms until chunks are sent or a stop request arrives.
+
+    Faults are injected through delays (seconds before answering, by
+    msg_id), garbled (msg_ids answered with broken xml) and silent, which
+    stops all answers.
+    """
+
+    def __init__(self, name: str = "cam"):
+        self.name = name
+        self.general = xml.SystemGeneral(timezone=0, device_name=name)
+        self.logins = 0
+        self.delays: Dict[int, float] = {}
+        self.garbled: Set[int] = set()
+        self.silent = False
+        self.chunks = 10
+        self.chunk_size = 1000
+        self.stops: List[int] = []
+        self._downloads: Dict[int, "asyncio.Task"] = {}
+
+    def answer(self, request: models.Message):
+        """ encoded reply to a request """
+
+        body = None
+        msg_id = request.meta.msg_id
+        if msg_id == MSG_ID_LOGIN:
+            self.logins += 1
+            if request.meta.msg_class == MSG_CLASS_LEGACY:
+                body = xml.Body(encryption=xml.Encryption("md5", "abc"))
+        elif msg_id == MSG_ID_VERSION:
+            body = xml.Body(
+                version_info=xml.VersionInfo(self.name, "SN", "d", "h", "c", "f", "x")
+            )
+        elif msg_id == MSG_ID_GET_GENERAL:
+            body = xml.Body(system_general=self.general)
+        elif msg_id == MSG_ID_FILE_INFO_LIST_OPEN:
+            body = xml.Body(file_info_list=xml.FileInfoList())
+        data = reply(request, body)
+        if msg_id in self.garbled:
+            # break the closing tag of the encrypted xml
+            data = data[:-4] + bytes(4)
+        return data
+
+    async def serve(self, reader, writer):
+        """ answer requests until the connection closes """
+
+        try:
+            while True:
+                request = await models.Message.async_read(reader.readexactly)
+                if self.silent:
+                    continue
+                delay = self.delays.get(request.meta.msg_id)
+                if not delay is None:
+                    await asyncio.sleep(delay)
+                writer.write(self.answer(request))
+                await writer.drain()
+                handle = request.meta.client_idx.handle
+                if request.meta.msg_id == MSG_ID_DOWNLOAD:
+                    self._downloads[handle] = asyncio.ensure_future(
+                        self._download(request, writer)
+                    )
+                elif request.meta.msg_id == MSG_ID_DOWNLOAD_STOP:
+                    self.stops.append(handle)
+                    task = self._downloads.pop(handle, None)
+                    if not task is None:
+                        task.cancel()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in self._downloads.values():
+                task.cancel()
+            writer.close()
+
+    async def _download(self, request: models.Message, writer):
+        for _ in range(self.chunks):
+            await asyncio.sleep(0.01)
+            writer.write(reply(request, binary=bytes(self.chunk_size)))
+        writer.write(reply(request))
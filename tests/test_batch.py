@@ -0,0 +1,34 @@
+""" Corked requests against a local fake camera """
+
+import asyncio
+
+from reolink_baichuan.client import Client
+
+from .fake import FakeCamera
+
+
+def test_cold_batch_single_write(monkeypatch):
+    writes = []
+    writelines = asyncio.StreamWriter.writelines
+
+    def _writelines(self, data):
+        data = list(data)
+        writes.append(len(data))
+        writelines(self, data)
+
+    monkeypatch.setattr(asyncio.StreamWriter, "writelines", _writelines)
+
+    async def _test():
+        camera = FakeCamera()
+        server = await asyncio.start_server(camera.serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = Client("127.0.0.1", port, "admin", "")
+        async with client.batch():
+            replies = await asyncio.gather(*(client.get_general() for _ in range(10)))
+        assert all(replies)
+        # the two login messages, then every request in one write
+        assert writes == [1, 1, 10]
+        await client.close()
+        server.close()
+
+    asyncio.run(_test())
@@ -0,0 +1,118 @@
+""" LAN discovery against local fake cameras """
+
+import asyncio
+
+from reolink_baichuan import discovery
+from reolink_baichuan.models.const import MSG_ID_VERSION
+
+from .fake import FakeCamera
+
+HOSTS = ("127.0.1.5", "127.0.1.77", "127.0.1.200")
+PORT = 19033
+
+
+async def _cameras():
+    servers = []
+    for host in HOSTS:
+        camera = FakeCamera(host)
+        servers.append(await asyncio.start_server(camera.serve, host, 0))
+    return servers
+
+
+def test_scan_finds_cameras():
+    async def _test():
+        servers = await _cameras()
+        # every fake listens on its own port, scan one port per run
+        found = []
+        for server in servers:
+            port = server.sockets[0].getsockname()[1]
+            found += [device async for device in discovery.scan("127.0.1.0/24", port)]
+        assert sorted(device.host for device in found) == sorted(HOSTS)
+        assert all(device.session is None for device in found)
+        for server in servers:
+            server.close()
+
+    asyncio.run(_test())
+
+
+def test_scan_identifies_with_session():
+    async def _test():
+        camera = FakeCamera()
+        server = await asyncio.start_server(camera.serve, "127.0.1.9", 0)
+        port = server.sockets[0].getsockname()[1]
+        found = [
+            device
+            async for device in discovery.scan(
+                ["127.0.1.8", "127.0.1.9"], port, username="admin", password=""
+            )
+        ]
+        assert [device.host for device in found] == ["127.0.1.9"]
+        device = found[0]
+        assert device.version_info.name == "cam"
+        # the session is logged in, no second login is needed
+        client = device.client()
+        assert client is device.session and client.authenticated
+        logins = camera.logins
+        assert (await client.get_general()).device_name == "cam"
+        assert camera.logins == logins
+        await client.close()
+        server.close()
+
+    asyncio.run(_test())
+
+
+def test_scan_bounded_time():
+    async def _test():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        found = [
+            device
+            async for device in discovery.scan(
+                "127.2.0.0/22", 9, concurrency=256, timeout=0.2
+            )
+        ]
+        assert found == []
+        # 1022 closed ports are refused at once
+        assert loop.time() - start < 5
+
+    asyncio.run(_test())
+
+
+def test_probe_single_deadline():
+    async def _test():
+        loop = asyncio.get_running_loop()
+        # accepts but never answers
+        server = await asyncio.start_server(
+            lambda reader, writer: None, "127.0.1.3", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        start = loop.time()
+        assert not await discovery.probe("127.0.1.3", port, timeout=0.3)
+        assert loop.time() - start < 0.45
+        server.close()
+
+    asyncio.run(_test())
+
+
+def test_scan_survives_bad_reply():
+    async def _test():
+        broken = FakeCamera("broken")
+        broken.garbled.add(MSG_ID_VERSION)
+        servers = [
+            await asyncio.start_server(camera.serve, host, PORT)
+            for (camera, host) in ((broken, "127.0.1.20"), (FakeCamera(), "127.0.1.21"))
+        ]
+        found = {
+            device.host: device
+            async for device in discovery.scan(
+                ["127.0.1.20", "127.0.1.21"], PORT, username="admin", password=""
+            )
+        }
+        assert found["127.0.1.20"].version_info is None
+        assert found["127.0.1.20"].session is None
+        assert found["127.0.1.21"].version_info.name == "cam"
+        await found["127.0.1.21"].session.close()
+        for server in servers:
+            server.close()
+
+    asyncio.run(_test())
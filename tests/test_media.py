@@ -0,0 +1,76 @@
+""" Incremental BcMedia demuxing """
+
+import random
+import struct
+import time
+
+from reolink_baichuan.models import media
+
+
+def _video(kind: media.MediaKind, size: int, rng: random.Random):
+    magic = media.MAGIC_IFRAME if kind == media.MediaKind.IFRAME else media.MAGIC_PFRAME
+    payload = rng.randbytes(size)
+    return (
+        struct.pack(media.VIDEO_STRUCT, magic, b"H264", size, 0, 1, 0)
+        + payload
+        + bytes((8 - size % 8) % 8)
+    )
+
+
+def _audio(size: int, rng: random.Random):
+    (header, padding) = media.audio_header(media.MediaKind.AAC, size)
+    return header + rng.randbytes(size) + padding
+
+
+def _frames(frames):
+    return [(frame.kind, bytes(frame.payload)) for frame in frames]
+
+
+def test_split_frames_match_whole():
+    rng = random.Random(1)
+    data = b"".join(
+        rng.choice(
+            (
+                lambda: _video(media.MediaKind.IFRAME, rng.randint(0, 5000), rng),
+                lambda: _video(media.MediaKind.PFRAME, rng.randint(0, 500), rng),
+                lambda: _audio(rng.randint(0, 300), rng),
+            )
+        )()
+        for _ in range(200)
+    )
+    for kinds in (None, (media.MediaKind.IFRAME,)):
+        whole = _frames(media.MediaReader(kinds).feed(data))
+        for _ in range(20):
+            reader = media.MediaReader(kinds)
+            split = []
+            offset = 0
+            while offset < len(data):
+                size = rng.choice((1, 3, 17, 1350, 4000))
+                split += _frames(reader.feed(data[offset : offset + size]))
+                offset += size
+            assert split == whole
+
+
+def _split_feed_time(data: bytes):
+    best = None
+    for _ in range(3):
+        reader = media.MediaReader()
+        start = time.perf_counter()
+        frames = [
+            frame
+            for offset in range(0, len(data), 1350)
+            for frame in reader.feed(data[offset : offset + 1350])
+        ]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    assert len(frames) == 1
+    return best
+
+
+def test_large_frame_linear():
+    rng = random.Random(2)
+    small = _split_feed_time(_video(media.MediaKind.IFRAME, 250000, rng))
+    large = _split_feed_time(_video(media.MediaKind.IFRAME, 1000000, rng))
+    # four times the data, sixteen times the time if every message recopied
+    # the frame so far
+    assert large < small * 8
@@ -0,0 +1,68 @@
+""" Recording search and download against a local fake camera """
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from reolink_baichuan import models
+from reolink_baichuan.client import Client
+
+from .fake import FakeCamera
+
+FILE = models.FileInfo(0, name="rec.mp4", stream_type="mainStream")
+
+
+async def _client(camera: FakeCamera):
+    server = await asyncio.start_server(camera.serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return (server, Client("127.0.0.1", port, "admin", ""))
+
+
+def test_search_without_results():
+    async def _test():
+        (server, client) = await _client(FakeCamera())
+        found = [
+            file
+            async for file in client.search_recordings(
+                0, datetime(2024, 1, 1), datetime(2024, 1, 2)
+            )
+        ]
+        assert found == []
+        await client.close()
+        server.close()
+
+    asyncio.run(_test())
+
+
+def test_download_complete():
+    async def _test():
+        camera = FakeCamera()
+        (server, client) = await _client(camera)
+        chunks = []
+        assert await client.download(FILE, chunks.append) == 10000
+        assert len(chunks) == 10 and camera.stops == []
+        await client.close()
+        server.close()
+
+    asyncio.run(_test())
+
+
+def test_download_stopped_early():
+    async def _test():
+        camera = FakeCamera()
+        camera.chunks = 1000
+        (server, client) = await _client(camera)
+
+        def _write(chunk):
+            raise OSError("disk full")
+
+        with pytest.raises(OSError):
+            await client.download(FILE, _write)
+        # the camera is told to stop and the connection stays usable
+        assert await client.ping()
+        assert len(camera.stops) == 1
+        await client.close()
+        server.close()
+
+    asyncio.run(_test())
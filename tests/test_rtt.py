@@ -0,0 +1,67 @@
+""" Request timeouts derived from round trips, against a local fake camera """
+
+import asyncio
+
+from reolink_baichuan.client import Client
+from reolink_baichuan.const import DEFAULT_MIN_TIMEOUT, DEFAULT_TIMEOUT
+from reolink_baichuan.models.const import MSG_ID_GET_GENERAL
+from reolink_baichuan.rtt import RttEstimator
+
+from .fake import FakeCamera
+
+
+async def _camera(camera: FakeCamera):
+    server = await asyncio.start_server(camera.serve, "127.0.0.1", 0)
+    return (server, server.sockets[0].getsockname()[1])
+
+
+def test_estimates_per_msg_id():
+    rtt = RttEstimator(floors={})
+    for _ in range(10):
+        rtt.sample(0.001, 93)
+    assert rtt.timeout(93) == DEFAULT_MIN_TIMEOUT
+    # an id not sampled yet is not shortened by fast pings
+    assert rtt.timeout(104) == rtt.initial
+    assert rtt.srtt < 0.01
+
+
+def test_fast_pings_keep_slower_replies():
+    async def _test():
+        camera = FakeCamera()
+        camera.delays[MSG_ID_GET_GENERAL] = 0.3
+        (server, port) = await _camera(camera)
+        client = Client("127.0.0.1", port, "admin", "")
+        for _ in range(5):
+            assert await client.ping()
+        for _ in range(3):
+            assert not await client.get_general() is None
+        await client.close()
+        server.close()
+
+    asyncio.run(_test())
+
+
+def test_dead_camera_tail_latency():
+    async def _test():
+        loop = asyncio.get_running_loop()
+        cameras = [FakeCamera(str(idx)) for idx in range(4)]
+        servers = [await _camera(camera) for camera in cameras]
+        clients = [Client("127.0.0.1", port, "admin", "") for (_, port) in servers]
+        for _ in range(5):
+            await asyncio.gather(*(client.get_general() for client in clients))
+
+        # one camera stops answering, the fleet wide gather is held for the
+        # derived timeout instead of DEFAULT_TIMEOUT
+        cameras[0].silent = True
+        start = loop.time()
+        replies = await asyncio.gather(*(client.get_general() for client in clients))
+        elapsed = loop.time() - start
+        assert replies[0] is None and all(replies[1:])
+        assert elapsed < 2 * DEFAULT_MIN_TIMEOUT < DEFAULT_TIMEOUT
+
+        for client in clients:
+            await client.close()
+        for (server, _) in servers:
+            server.close()
+
+    asyncio.run(_test())
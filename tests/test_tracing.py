@@ -0,0 +1,96 @@
+""" Tracing hooks, including their cost when disabled """
+
+import asyncio
+import timeit
+
+import pytest
+
+from reolink_baichuan import models
+from reolink_baichuan.models import message, tracing
+from reolink_baichuan.models.metadata import Metadata
+
+GENERAL = models.Message.from_xml(
+    models.XmlBody(system_general=models.SystemGeneral(timezone=3600, year=2024))
+)
+DATA = GENERAL.tobytes()
+
+
+class Recorder(tracing.Tracer):
+    """ records ended spans """
+
+    def __init__(self):
+        self.ended = []
+
+    def start(self, name, msg_id=None, size=None):
+        return name
+
+    def end(self, token, size=None):
+        self.ended.append((token, size))
+
+
+def _reader(data: bytes):
+    offset = 0
+
+    async def _read(size: int):
+        nonlocal offset
+        offset += size
+        return data[offset - size : offset]
+
+    return _read
+
+
+async def _baseline_read(read):
+    # async_read without the tracing branch
+    context = await Metadata.async_read(read)
+    data = await read(context.body_len)
+    return message.Message(
+        context.metadata, message._unpack_body(context, data, True)
+    )
+
+
+def _ratio(stmt, baseline, number=200, repeat=25):
+    # runs alternate so load from elsewhere hits both, best of each
+    timed = [float("inf"), float("inf")]
+    for _ in range(repeat):
+        timed[0] = min(timed[0], timeit.timeit(stmt, number=number))
+        timed[1] = min(timed[1], timeit.timeit(baseline, number=number))
+    return timed[0] / timed[1]
+
+
+def test_disabled_overhead():
+    assert tracing.get_tracer() is None
+    loop = asyncio.new_event_loop()
+    try:
+        assert (
+            _ratio(lambda: GENERAL._pack(True), lambda: GENERAL._pack_buffer(True))
+            < 1.1
+        )
+        assert (
+            _ratio(
+                lambda: loop.run_until_complete(
+                    models.Message.async_read(_reader(DATA))
+                ),
+                lambda: loop.run_until_complete(_baseline_read(_reader(DATA))),
+            )
+            < 1.1
+        )
+    finally:
+        loop.close()
+
+
+def test_spans_end_on_error():
+    recorder = Recorder()
+    tracing.set_tracer(recorder)
+    try:
+        broken = DATA[:-4] + bytes(4)
+        with pytest.raises(Exception):
+            asyncio.run(models.Message.async_read(_reader(broken)))
+        assert [name for (name, _) in recorder.ended] == [
+            tracing.SPAN_DECRYPT,
+            tracing.SPAN_PARSE,
+            tracing.SPAN_READ,
+        ]
+        # the failed spans carry no size
+        assert recorder.ended[-1][1] is None
+    finally:
+        tracing.set_tracer(None)
@@ -0,0 +1,142 @@
+""" UDP transport against a lossy loopback stand-in """
+
+import asyncio
+import random
+import struct
+
+from typing import Set, Tuple
+
+import pytest
+
+from reolink_baichuan import models, udp
+from reolink_baichuan.client import Client
+from reolink_baichuan.models.metadata import MSG_CLASS_MODERN, Metadata
+from reolink_baichuan.models.modern import Modern, xml
+
+
+class LossyPeer(udp.UdpProtocol):
+    """
+    UdpProtocol peer dropping a share of datagrams in both directions
+
+    Whether a datagram is dropped depends on its direction, kind and packet
+    id only, not on timing, and each is dropped at most once, so every run
+    loses the same packets.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, loss: float, seed: int = 1):
+        super().__init__(reader, None)
+        self._seed = seed
+        self._loss = loss
+        self._seen: Set[Tuple[str, int, int]] = set()
+
+    def _drop(self, direction: str, data) -> bool:
+        (magic,) = struct.unpack_from("<I", data)
+        if magic == udp.UDP_MAGIC_DATA:
+            packet_id = struct.unpack_from(udp.DATA_STRUCT, data)[3]
+        else:
+            packet_id = struct.unpack_from(udp.ACK_STRUCT, data)[4]
+        key = (direction, magic, packet_id)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return random.Random(f"{self._seed}:{key}").random() < self._loss
+
+    def datagram_received(self, data, addr):
+        if self.connection_id is None:
+            # adopt the connection id of the first packet, as no handshake
+            # negotiates it
+            (_, self.connection_id) = struct.unpack_from("<Ii", data)
+        if not self._drop("in", data):
+            super().datagram_received(data, addr)
+
+    def _sendto(self, data):
+        if not self._drop("out", data):
+            super()._sendto(data)
+
+
+async def _peer(loss: float):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    (transport, protocol) = await loop.create_datagram_endpoint(
+        lambda: LossyPeer(reader, loss), local_addr=("127.0.0.1", 0)
+    )
+    port = transport.get_extra_info("sockname")[1]
+    return (reader, udp.UdpWriter(transport, protocol), port)
+
+
+def _reply(request: models.Message, body=None, binary=None):
+    meta = Metadata(
+        request.meta.msg_id,
+        request.meta.client_idx,
+        msg_class=MSG_CLASS_MODERN,
+        encrypted=True,
+    )
+    return models.Message(meta, Modern(body, binary)).tobytes()
+
+
+async def _camera(reader: asyncio.StreamReader, writer: udp.UdpWriter):
+    while True:
+        request = await models.Message.async_read(reader.readexactly)
+        body = None
+        if request.meta.msg_id == 1 and request.meta.msg_class == 0x6514:
+            body = xml.Body(encryption=xml.Encryption("md5", "abc"))
+        elif request.meta.msg_id == 104:
+            body = xml.Body(system_general=xml.SystemGeneral(timezone=3600))
+        writer.write(_reply(request, body))
+
+
+def test_lossy_echo():
+    async def _test():
+        (peer_reader, peer_writer, port) = await _peer(0.2)
+
+        async def _echo():
+            while True:
+                peer_writer.write(await peer_reader.read(65536))
+
+        echo = asyncio.ensure_future(_echo())
+        (reader, writer) = await udp.open_udp_connection("127.0.0.1", port)
+        data = bytes(random.Random(2).getrandbits(8) for _ in range(200000))
+        writer.write(data)
+        assert await asyncio.wait_for(reader.readexactly(len(data)), 30) == data
+        echo.cancel()
+        writer.close()
+        peer_writer.close()
+
+    asyncio.run(_test())
+
+
+def test_client_over_lossy_link():
+    async def _test():
+        (peer_reader, peer_writer, port) = await _peer(0.2)
+        camera = asyncio.ensure_future(_camera(peer_reader, peer_writer))
+        client = Client("127.0.0.1", port, "admin", "", udp=True)
+        for _ in range(10):
+            assert await asyncio.wait_for(client.ping(), 30)
+        general = await asyncio.wait_for(client.get_general(), 30)
+        assert general.timezone == 3600
+        await client.close()
+        camera.cancel()
+        peer_writer.close()
+
+    asyncio.run(_test())
+
+
+def test_dead_peer_closes():
+    async def _test():
+        loop = asyncio.get_running_loop()
+        # a socket that never answers
+        (silent, _) = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, local_addr=("127.0.0.1", 0)
+        )
+        port = silent.get_extra_info("sockname")[1]
+        (reader, writer) = await udp.open_udp_connection(
+            "127.0.0.1", port, window=4, retries=2
+        )
+        writer.write(bytes(udp.DEFAULT_UDP_MTU * 8))
+        with pytest.raises(ConnectionResetError):
+            await asyncio.wait_for(writer.drain(), 10)
+        with pytest.raises(ConnectionResetError):
+            await asyncio.wait_for(reader.readexactly(1), 1)
+        silent.close()
+
+    asyncio.run(_test())